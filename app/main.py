@@ -1,43 +1,24 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Query, Path, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from datetime import datetime, timedelta
+from collections import OrderedDict
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import bisect
+import functools
+import hashlib
 import os
-import json
-import math
-import numpy as np
 from app.services.sales_analyzer import SalesAnalyzer
 from app.services.inventory_predictor import InventoryPredictor
-from typing import List, Dict, Optional, Any
+from app.services.backtest import Backtester
+from app.services.local_bucket import LocalBucket
+from app.services.refresh_job import RefreshJob
+from app.responses import FastJSONResponse, NDJSONResponse, CompressionMiddleware, finite_list, wants_ndjson
+from typing import List, Dict, Optional
 from pydantic import BaseModel, ConfigDict
 
-# Custom JSON encoder to handle NaN values
-class NaNJSONEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, float) and (math.isnan(obj) or math.isinf(obj)):
-            return None
-        if isinstance(obj, np.float64) or isinstance(obj, np.float32):
-            if np.isnan(obj) or np.isinf(obj):
-                return None
-            return float(obj)
-        if isinstance(obj, np.int64) or isinstance(obj, np.int32):
-            return int(obj)
-        if isinstance(obj, datetime):
-            return obj.isoformat()
-        return super().default(obj)
-
-# Custom JSONResponse class
-class CustomJSONResponse(JSONResponse):
-    def render(self, content: Any) -> bytes:
-        return json.dumps(
-            content,
-            ensure_ascii=False,
-            allow_nan=False,
-            cls=NaNJSONEncoder,
-        ).encode("utf-8")
-
 # Initialize FastAPI app
-app = FastAPI(title="Burgertone Inventory API", default_response_class=CustomJSONResponse)
+app = FastAPI(title="Burgertone Inventory API", default_response_class=FastJSONResponse)
 
 # Add CORS middleware
 app.add_middleware(
@@ -46,14 +27,54 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Total-Count", "X-Next-Offset"],
 )
 
+# Compress responses (brotli when installed, else gzip) unless disabled
+if os.getenv("RESPONSE_COMPRESSION", "1") != "0":
+    app.add_middleware(CompressionMiddleware, minimum_size=1000)
+
 # Initialize services
 project_root = os.path.dirname(os.path.dirname(__file__))
 credentials_path = os.path.join(project_root, "credentials", "burgertone-credentials.json")
 
-analyzer = SalesAnalyzer(credentials_path=credentials_path)
-predictor = InventoryPredictor()
+# REPORTS_DIR serves reports from a local directory instead of GCS (development/tests)
+reports_dir = os.getenv("REPORTS_DIR")
+# Parsed history is snapshotted here so restarts and extra workers skip the full download
+cache_dir = os.getenv("SALES_CACHE_DIR", os.path.join(project_root, "cache"))
+if reports_dir:
+    analyzer = SalesAnalyzer(bucket=LocalBucket(reports_dir), cache_dir=cache_dir)
+else:
+    analyzer = SalesAnalyzer(credentials_path=credentials_path, cache_dir=cache_dir)
+# Trained models are persisted here and reused when an item's data is unchanged
+model_dir = os.getenv("MODEL_DIR", os.path.join(cache_dir, "models"))
+predictor = InventoryPredictor(model_dir=model_dir)
+# Rolling-origin accuracy of the trained models, rerun after each retrain
+backtester = Backtester()
+
+# Blocking pandas/sklearn work and OpenAI calls run on a bounded thread pool so
+# the event loop keeps serving other requests while a reload or retrain runs
+executor = ThreadPoolExecutor(max_workers=int(os.getenv("API_WORKERS", 4)))
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking call on the worker pool and await its result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+# Background refresh: reload new reports, retrain changed items and warm the
+# prediction cache well before the 6-hour data cache expires (0 disables it)
+refresh_interval = float(os.getenv("REFRESH_INTERVAL_MINUTES", 60)) * 60
+warm_days = int(os.getenv("PREDICTION_WARM_DAYS", 7))
+background_tasks = set()
+
+# Read responses carry an ETag of the data (and model) versions they were built
+# from, and may be cached by a proxy for CACHE_MAX_AGE seconds
+cache_control = f"public, max-age={int(os.getenv('CACHE_MAX_AGE', 60))}"
+
+# Refresh jobs by id (most recent last); at most one runs at a time, and a
+# full one may be queued behind a running incremental one
+refresh_jobs = OrderedDict()
+max_refresh_jobs = 20
 
 # Pydantic models with better type definitions
 class Prediction(BaseModel):
@@ -73,128 +94,412 @@ class HistoricalDataResponse(BaseModel):
     quantities: List[int]
     sales: List[float]
 
+class BulkHistoricalDataResponse(BaseModel):
+    dates: List[str]
+    items: List[str]
+    quantities: Dict[str, List[Optional[int]]]
+    sales: Dict[str, List[Optional[float]]]
+
+def refresh_and_warm(full=False, progress=None):
+    """Reload new reports, retrain changed items and precompute predictions of items in use
+    
+    Requests keep being served from the previous data and models while this
+    runs; each is swapped in as a whole once ready. `full` rebuilds the history
+    from every report instead of only new or changed ones. Returns the history.
+    """
+    df = analyzer.load_historical_data(force_reload=True, incremental=not full, progress=progress)
+    predictor.train(df, progress=progress)
+    # Only items whose model is in memory (i.e. recently requested) are warmed,
+    # so this never loads saved models; shorter horizons are served from the
+    # cached longest one
+    predictor.predict(df, days_ahead=warm_days, items=predictor.models.resident_items())
+    return df
+
+def run_backtest(df, progress=None):
+    """Backtest the current models on `df` (skipped with BACKTEST_FOLDS=0)
+    
+    Runs after the new models are already served; /api/inventory/metrics
+    serves the previous report until it completes.
+    """
+    if backtester.folds > 0:
+        backtester.run(predictor, df, progress=progress)
+
+def start_backtest(df):
+    """Run the backtest in the background"""
+    async def run():
+        try:
+            await run_blocking(run_backtest, df)
+        except Exception as e:
+            print(f"Error during backtest: {e}")
+    
+    task = asyncio.create_task(run())
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+async def run_refresh_job(job, after=None):
+    """Run a refresh job on the worker pool once `after` is done, recording its outcome"""
+    while after is not None and not after.done:
+        await asyncio.sleep(1)
+    job.run()
+    try:
+        df = await run_blocking(refresh_and_warm, full=job.full, progress=job)
+        # The last stage: the new models are already being served
+        await run_blocking(run_backtest, df, progress=job)
+        job.succeed()
+    except Exception as e:
+        print(f"Error during refresh job {job.id}: {e}")
+        job.fail(str(e))
+
+def start_refresh_job(full=False):
+    """Start a refresh job, or return an unfinished one that covers it
+    
+    A full refresh requested while only an incremental one is running is
+    queued to start once that finishes.
+    """
+    unfinished = [job for job in refresh_jobs.values() if not job.done]
+    for job in reversed(unfinished):
+        if job.full or not full:
+            return job
+    
+    job = RefreshJob(full=full)
+    refresh_jobs[job.id] = job
+    while len(refresh_jobs) > max_refresh_jobs:
+        refresh_jobs.popitem(last=False)
+    
+    task = asyncio.create_task(run_refresh_job(job, after=unfinished[-1] if unfinished else None))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return job
+
+async def background_refresh():
+    """Run an incremental refresh job every `refresh_interval` seconds"""
+    while True:
+        await asyncio.sleep(refresh_interval)
+        print("Background refresh of data and models...")
+        job = start_refresh_job()
+        while not job.done:
+            await asyncio.sleep(1)
+
 @app.on_event("startup")
 async def startup_event():
-    """Load and train model on startup"""
+    """Load data and train models on startup (unchanged items reuse saved models)"""
     try:
         print("Loading historical data and training model...")
-        # Force reload data on startup
-        df = analyzer.load_historical_data(force_reload=True)
-        predictor.train(df)
+        # Force reload data on startup and warm the prediction cache
+        df = await run_blocking(refresh_and_warm)
         print("Model training completed")
     except Exception as e:
         print(f"Error during startup: {e}")
         raise e
+    
+    # Serving does not wait for the backtest
+    start_backtest(df)
+    
+    if refresh_interval > 0:
+        background_tasks.add(asyncio.create_task(background_refresh()))
+
+@app.on_event("shutdown")
+def shutdown_event():
+    """Stop the background refresh and the worker pool"""
+    for task in background_tasks:
+        task.cancel()
+    executor.shutdown(wait=False, cancel_futures=True)
+
+def current_versions(include_model):
+    """Versions a read response depends on, or None before data/models are loaded"""
+    versions = [analyzer.data_version]
+    if include_model:
+        versions += [predictor.version, predictor.strategy]
+    return None if None in versions else versions
+
+def make_etag(request, versions, variant=None):
+    """Weak ETag of the versions, the request URL (path and query) and the representation variant"""
+    if versions is None:
+        return None
+    digest = hashlib.sha1(repr((versions, str(request.url.path), str(request.url.query), variant)).encode('utf-8'))
+    return f'W/"{digest.hexdigest()[:20]}"'
+
+def etag_matches(request, etag):
+    if_none_match = request.headers.get("if-none-match", "")
+    return any(tag.strip() in (etag, "*") for tag in if_none_match.split(","))
+
+async def conditional_response(request, build, *args, include_model=False, render=FastJSONResponse,
+                               variant=None, vary=None):
+    """Answer a read with 304 when the client's ETag is current, else build it
+    
+    The 304 path only compares version strings: no data is loaded or formatted.
+    The ETag is omitted if the versions changed while the response was built.
+    `variant` identifies the negotiated representation (so each has its own
+    ETag) and `vary` names the request headers it was negotiated on.
+    """
+    versions = current_versions(include_model)
+    etag = make_etag(request, versions, variant)
+    vary_headers = {"Vary": vary} if vary else {}
+    if etag is not None and etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control, **vary_headers})
+    
+    response = render(await run_blocking(build, *args))
+    response.headers.update(vary_headers)
+    
+    if current_versions(include_model) != versions:
+        etag = None
+    if etag is not None:
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = cache_control
+    return response
+
+def paged(render):
+    """Render a (payload, total, next_offset) page with pagination headers"""
+    def render_page(page):
+        payload, total, next_offset = page
+        response = render(payload)
+        response.headers["X-Total-Count"] = str(total)
+        if next_offset is not None:
+            response.headers["X-Next-Offset"] = str(next_offset)
+        return response
+    return render_page
+
+def page_bounds(total, offset, limit):
+    """Slice bounds of a page and the offset of the next one (None on the last page)"""
+    stop = total if limit is None else min(total, offset + limit)
+    return offset, stop, (stop if stop < total else None)
 
 @app.get("/")
 async def root():
     """Root endpoint"""
     return {"message": "Burgertone Inventory API"}
 
+def build_predictions(days, items=None, start=None, end=None, offset=0, limit=None):
+    """Predictions page for the next `days` days
+    
+    Only the items on the requested page are predicted; `start`/`end` keep the
+    predicted dates in that range.
+    """
+    # Load latest data (will use cache if available)
+    df = analyzer.load_historical_data()
+    
+    # Items in response order, then the page of them
+    selected = list(predictor.models) if items is None else [
+        item for item in dict.fromkeys(items) if item in predictor.models
+    ]
+    lo, hi, next_offset = page_bounds(len(selected), offset, limit)
+    
+    # Get predictions
+    predictions = predictor.predict(df, days_ahead=days, items=selected[lo:hi])
+    index = analyzer.get_item_index()
+    
+    # Format response (predictions already hold YYYY-MM-DD dates, which sort
+    # chronologically, and are serialized as they are, without copying)
+    start = start.isoformat() if start else None
+    end = end.isoformat() if end else None
+    response = []
+    for item, preds in predictions.items():
+        first = 0 if start is None else bisect.bisect_left(preds, start, key=lambda p: p["date"])
+        last = len(preds) if end is None else bisect.bisect_right(preds, end, key=lambda p: p["date"])
+        response.append({
+            "item_name": item,
+            "predictions": preds[first:last] if (first, last) != (0, len(preds)) else preds,
+            "historical_avg": round(index.mean_quantity(item), 2)
+        })
+    return response, len(selected), next_offset
+
 @app.get("/api/inventory/predictions/{days}", response_model=List[PredictionResponse])
-async def get_predictions(days: int = 7):
-    """Get inventory predictions for specified number of days"""
+async def get_predictions(
+    request: Request,
+    days: int = Path(..., ge=1),
+    stream: bool = False,
+    items: Optional[List[str]] = Query(None),
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1)
+):
+    """Get inventory predictions for specified number of days
+    
+    `items` restricts the response to some items, `offset`/`limit` page
+    through them (X-Total-Count and X-Next-Offset headers) and `start`/`end`
+    keep the predicted dates in a range. With `stream=true` (or `Accept:
+    application/x-ndjson`) items are streamed as newline-delimited JSON, one
+    item per line.
+    """
     try:
-        # Load latest data (will use cache if available)
-        df = analyzer.load_historical_data()
-        
-        # Get predictions
-        predictions = predictor.predict(df, days_ahead=days)
-        
-        # Format response
-        response = []
-        for item, preds in predictions.items():
-            historical_avg = df[df['item_name'] == item]['quantity'].mean()
-            
-            # Ensure dates are in string format (YYYY-MM-DD)
-            formatted_predictions = []
-            for p in preds:
-                # Make sure date is a string
-                date_str = p["date"] if isinstance(p["date"], str) else p["date"].strftime('%Y-%m-%d')
-                formatted_predictions.append({
-                    "date": date_str,
-                    "predicted_quantity": p["predicted_quantity"]
-                })
-            
-            response.append({
-                "item_name": item,
-                "predictions": formatted_predictions,
-                "historical_avg": round(historical_avg, 2)
-            })
-        
-        return response
+        # Returned as a response directly: the payload is already in its final
+        # shape, so the response_model re-validation is skipped
+        ndjson = wants_ndjson(request, stream)
+        render = NDJSONResponse if ndjson else FastJSONResponse
+        return await conditional_response(request, build_predictions, days, items, start, end,
+                                          offset, limit, include_model=True, render=paged(render),
+                                          variant="ndjson" if ndjson else "json", vary="Accept")
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def build_historical_data(item_name, days, start=None, end=None, offset=0, limit=None):
+    """Historical data page for one item"""
+    # Use cached data
+    analyzer.load_historical_data()
+    
+    # Item rows come from the per-item index instead of a full-frame filter
+    item_data = analyzer.get_item_index().history(item_name, days, start, end)
+    total = len(item_data)
+    lo, hi, next_offset = page_bounds(total, offset, limit)
+    item_data = item_data.iloc[lo:hi]
+    
+    # Format dates as strings
+    formatted_dates = item_data['date'].dt.strftime('%Y-%m-%d').tolist()
+    
+    return {
+        "item_name": item_name,
+        "dates": formatted_dates,
+        "quantities": finite_list(item_data['quantity']),
+        "sales": finite_list(item_data['sales'])
+    }, total, next_offset
+
 @app.get("/api/inventory/historical/{item_name}", response_model=HistoricalDataResponse)
-async def get_historical_data(item_name: str, days: Optional[int] = 30):
-    """Get historical data for specific item"""
+async def get_historical_data(
+    request: Request,
+    item_name: str,
+    days: Optional[int] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1)
+):
+    """Get historical data for specific item
+    
+    `start`/`end` select a date range (inclusive) and `days` its most recent
+    days; without either date the last 30 days are returned. `offset`/`limit`
+    page through the rows (X-Total-Count and X-Next-Offset headers).
+    """
+    if start is None and end is None and days is None:
+        days = 30
     try:
-        # Use cached data
-        df = analyzer.load_historical_data()
-        
-        # Filter data
-        item_data = df[df['item_name'] == item_name].tail(days)
-        
-        # Format dates as strings
-        formatted_dates = item_data['date'].dt.strftime('%Y-%m-%d').tolist()
+        return await conditional_response(request, build_historical_data, item_name, days,
+                                          start, end, offset, limit, render=paged(FastJSONResponse))
         
-        return {
-            "item_name": item_name,
-            "dates": formatted_dates,
-            "quantities": item_data['quantity'].tolist(),
-            "sales": item_data['sales'].tolist()
-        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def build_bulk_history(items, start, end, days):
+    """Columnar history of many items: one shared date axis, one array per item"""
+    # Use cached data
+    analyzer.load_historical_data()
+    index = analyzer.get_item_index()
+    
+    # Slices of the per-load date x item tables, not one filter per item
+    quantities = index.history_table('quantity', items, start, end, days)
+    sales = index.history_table('sales', items, start, end, days)
+    
+    return {
+        "dates": quantities.index.strftime('%Y-%m-%d').tolist(),
+        "items": quantities.columns.tolist(),
+        "quantities": {item: finite_list(quantities[item].to_numpy(), integer=True) for item in quantities.columns},
+        "sales": {item: finite_list(sales[item].to_numpy()) for item in sales.columns}
+    }
+
+@app.get("/api/inventory/historical", response_model=BulkHistoricalDataResponse)
+async def get_bulk_historical_data(
+    request: Request,
+    items: Optional[List[str]] = Query(None),
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    days: Optional[int] = None
+):
+    """Get historical data for many items (all by default) in one columnar payload
+    
+    Dates missing for an item are null. Without `start`, the most recent 30
+    dates are returned unless `days` says otherwise.
+    """
+    if start is None and days is None:
+        days = 30
+    try:
+        return await conditional_response(request, build_bulk_history, items, start, end, days)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def build_item_insights(item_name):
+    """AI insights response for one item (the OpenAI call blocks its worker thread)"""
+    # Use cached data
+    df = analyzer.load_historical_data()
+    predictions = predictor.predict(df, days_ahead=7)
+    
+    if item_name not in predictions:
+        raise HTTPException(status_code=404, detail="Item not found")
+        
+    item_predictions = {item_name: predictions[item_name]}
+    historical_averages = {item_name: analyzer.get_item_index().mean_quantity(item_name)}
+    insights = predictor.get_ai_insights(item_predictions, df, historical_averages)
+    
+    return {"insights": insights}
+
 @app.get("/api/inventory/insights/{item_name}")
-async def get_item_insights(item_name: str):
+async def get_item_insights(request: Request, item_name: str):
     """Get AI insights for specific item"""
     try:
-        # Use cached data
-        df = analyzer.load_historical_data()
-        predictions = predictor.predict(df, days_ahead=7)
-        
-        if item_name not in predictions:
-            raise HTTPException(status_code=404, detail="Item not found")
-            
-        item_predictions = {item_name: predictions[item_name]}
-        insights = predictor.get_ai_insights(item_predictions, df)
-        
-        return {"insights": insights}
+        return await conditional_response(request, build_item_insights, item_name, include_model=True)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def build_items():
+    """Items response from the per-item index"""
+    # Use cached data
+    analyzer.load_historical_data()
+    return {"items": analyzer.get_item_index().items}
+
 @app.get("/api/inventory/items")
-async def get_items():
+async def get_items(request: Request):
     """Get list of all menu items"""
     try:
-        # Use cached data
-        df = analyzer.load_historical_data()
-        items = df['item_name'].unique().tolist()
-        return {"items": items}
+        return await conditional_response(request, build_items)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/inventory/refresh-data")
-async def refresh_data():
-    """Force refresh of the data cache"""
+def build_metrics(report):
+    """Backtest report response (already in its final shape)"""
+    return report
+
+@app.get("/api/inventory/metrics")
+async def get_metrics(request: Request):
+    """Get rolling-origin backtest MAE, MAPE and bias overall, per forecast day and per item
+    
+    Serves the last completed backtest (`model_version` names the models it
+    scored), or 503 with status "pending" until the first one completes.
+    """
+    report = backtester.results
+    if report is None:
+        return FastJSONResponse({"status": "pending"}, status_code=503, headers={"Retry-After": "30"})
     try:
-        # Clear data cache and reload data
-        analyzer.clear_cache()
-        df = analyzer.load_historical_data(force_reload=True)
-        
-        # Clear prediction cache
-        predictor.clear_prediction_cache()
-        
-        # Retrain model with fresh data
-        predictor.train(df)
+        return await conditional_response(request, build_metrics, report,
+                                          variant=(report['model_version'], report['backend'], report['strategy']))
         
-        return {"status": "success", "message": "Data refreshed and model retrained"}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/inventory/cache-stats")
+async def get_cache_stats():
+    """Get prediction cache hit/miss counters and the memory of the loaded history and models"""
+    return {**predictor.get_cache_stats(), "history_memory": analyzer.memory_report,
+            "models": predictor.get_model_stats()}
+
+@app.post("/api/inventory/refresh-data", status_code=202)
+@app.get("/api/inventory/refresh-data", status_code=202)
+async def refresh_data():
+    """Start a full refresh of the data and models in the background
+    
+    The previous data keeps being served until the new data is swapped in.
+    Returns the job (a running or queued full refresh is returned instead of
+    starting another, and one queued behind a running incremental refresh);
+    poll /api/inventory/refresh-data/{job_id} for progress.
+    """
+    return start_refresh_job(full=True).to_dict()
+
+@app.get("/api/inventory/refresh-data/{job_id}")
+async def get_refresh_job(job_id: str):
+    """Get status, per-stage timing and counts of a refresh job"""
+    job = refresh_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Refresh job not found")
+    return job.to_dict()
\ No newline at end of file
@@ -0,0 +1,202 @@
+"""
+Fast JSON, NDJSON streaming and response compression for the FastAPI app
+"""
+import json
+import math
+import zlib
+from datetime import date, datetime
+
+import numpy as np
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.datastructures import Headers, MutableHeaders
+
+# orjson and brotli are optional: without them responses fall back to the
+# stdlib encoder and gzip-only compression
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def _default(obj):
+    """Encode the values orjson (or the stdlib encoder) does not handle natively"""
+    if isinstance(obj, np.ndarray):
+        return finite_list(obj)
+    if isinstance(obj, np.generic):
+        return _finite(obj.item())
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _finite(value):
+    if isinstance(value, float) and (math.isnan(value) or math.isinf(value)):
+        return None
+    return value
+
+
+def _sanitize(obj):
+    """Replace NaN/inf floats with None throughout a payload (stdlib fallback only)"""
+    if isinstance(obj, float):
+        return _finite(obj)
+    if isinstance(obj, dict):
+        return {key: _sanitize(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_sanitize(value) for value in obj]
+    return obj
+
+
+def finite_list(values, integer=False):
+    """Array or Series as a list with NaN/inf replaced by None, vectorized
+
+    With `integer` the finite values are returned as ints (e.g. quantities that
+    became floats when missing days were filled with NaN).
+    """
+    values = np.asarray(values)
+    if values.dtype.kind != 'f':
+        return values.tolist()
+    finite = np.isfinite(values)
+    if finite.all():
+        return values.astype(np.int64).tolist() if integer else values.tolist()
+    result = np.full(len(values), None, dtype=object)
+    result[finite] = (values[finite].astype(np.int64) if integer else values[finite]).tolist()
+    return result.tolist()
+
+
+def dumps(content):
+    """Serialize a payload to JSON bytes; NaN/inf become null and NumPy values are supported"""
+    if orjson is not None:
+        return orjson.dumps(
+            content,
+            default=_default,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+        )
+    return json.dumps(
+        _sanitize(content),
+        ensure_ascii=False,
+        allow_nan=False,
+        default=_default,
+        separators=(',', ':'),
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered by `dumps` (orjson when available)"""
+
+    def render(self, content):
+        return dumps(content)
+
+
+class NDJSONResponse(StreamingResponse):
+    """Streams an iterable of records as newline-delimited JSON, one line per record"""
+
+    media_type = "application/x-ndjson"
+
+    def __init__(self, records, **kwargs):
+        super().__init__((dumps(record) + b"\n" for record in records), **kwargs)
+
+
+def wants_ndjson(request, stream=False):
+    """Whether a request asked for a streamed NDJSON response"""
+    return stream or "application/x-ndjson" in request.headers.get("accept", "")
+
+
+class CompressionMiddleware:
+    """Compress responses with brotli (if installed) or gzip, per Accept-Encoding
+
+    Streamed bodies are flushed after every chunk, so NDJSON clients still
+    receive records as they are produced. Small bodies are sent as is.
+    """
+
+    def __init__(self, app, minimum_size=1000, gzip_level=6, brotli_quality=4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accepted = Headers(scope=scope).get("accept-encoding", "")
+        if brotli is not None and "br" in accepted:
+            encoding = "br"
+        elif "gzip" in accepted:
+            encoding = "gzip"
+        else:
+            await self.app(scope, receive, send)
+            return
+
+        await _CompressedResponder(self, encoding, send).run(scope, receive)
+
+
+class _CompressedResponder:
+    def __init__(self, middleware, encoding, send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.send = send
+        self.start_message = None
+        self.compressor = None
+        self.passthrough = False
+
+    async def run(self, scope, receive):
+        await self.middleware.app(scope, receive, self.send_compressed)
+
+    def _compress(self, body, final):
+        if self.encoding == "br":
+            data = self.compressor.process(body)
+            return data + (self.compressor.finish() if final else self.compressor.flush())
+        data = self.compressor.compress(body)
+        return data + self.compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+    async def send_compressed(self, message):
+        if message["type"] == "http.response.start":
+            # Held back until the first body chunk decides whether to compress
+            self.start_message = message
+            self.passthrough = "content-encoding" in Headers(raw=message["headers"])
+            return
+
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        if self.start_message is not None:
+            start_message, self.start_message = self.start_message, None
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if self.passthrough or (not more_body and len(body) < self.middleware.minimum_size):
+                self.passthrough = True
+                await self.send(start_message)
+                await self.send(message)
+                return
+
+            if self.encoding == "br":
+                self.compressor = brotli.Compressor(quality=self.middleware.brotli_quality)
+            else:
+                self.compressor = zlib.compressobj(self.middleware.gzip_level, zlib.DEFLATED, 31)
+
+            headers = MutableHeaders(raw=start_message["headers"])
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            body = self._compress(body, final=not more_body)
+            if more_body:
+                del headers["Content-Length"]
+            else:
+                headers["Content-Length"] = str(len(body))
+            await self.send(start_message)
+            await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
+            return
+
+        if self.passthrough:
+            await self.send(message)
+            return
+
+        more_body = message.get("more_body", False)
+        body = self._compress(message.get("body", b""), final=not more_body)
+        await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
@@ -0,0 +1,170 @@
+import os
+import threading
+import time
+
+import numpy as np
+from joblib import Parallel, delayed
+
+from app.services.feature_store import FEATURE_COLUMNS
+from app.services.inventory_predictor import (
+    RollingWindow, fit_scaled, forecast_recursive, forecast_static, horizon_calendar
+)
+from app.services.refresh_job import Progress
+
+# Fewest training days an item needs at a fold's origin (as in training)
+MIN_TRAIN_DAYS = 10
+
+
+def _backtest_item(X, y, days, origins, calendars, backend, strategy):
+    """Forecast each fold of one item, returning (predicted, actual) arrays of shape (folds, horizon)
+
+    `X` and `y` are the item's features and quantities on its active days,
+    whose day indexes are `days`. Features only look back in time, so a fold
+    trains on the rows before its origin as they are: nothing is recomputed
+    per fold. Folds with too little history, and days without a report, are
+    NaN. Module level so it can run in a joblib worker.
+    """
+    horizon = calendars.shape[1]
+    predicted = np.full((len(origins), horizon), np.nan)
+    actual = np.full((len(origins), horizon), np.nan)
+    for fold, origin in enumerate(origins):
+        train_days = np.searchsorted(days, origin)
+        if train_days < MIN_TRAIN_DAYS:
+            continue
+
+        model, scaler = fit_scaled(X[:train_days], y[:train_days], backend)
+        history = y[:train_days]
+        if strategy == 'recursive':
+            forecast = forecast_recursive(model, scaler, RollingWindow(history), calendars[fold])
+        else:
+            forecast = forecast_static(model, scaler, history, calendars[fold])
+        # Scored as served: rounded and non-negative
+        predicted[fold] = np.maximum(np.rint(forecast), 0)
+        horizon_days = days[train_days:train_days + horizon]
+        horizon_days = horizon_days[horizon_days < origin + horizon]
+        actual[fold, horizon_days - origin] = y[train_days:train_days + len(horizon_days)]
+    return predicted, actual
+
+
+def _error_metrics(predicted, actual, axis):
+    """MAE, MAPE (%, over days with sales) and bias (mean over-forecast) along `axis`"""
+    error = predicted - actual
+    scored = ~np.isnan(error)
+    samples = scored.sum(axis=axis)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mae = np.nansum(np.abs(error), axis=axis) / samples
+        bias = np.nansum(error, axis=axis) / samples
+        sold = scored & (actual > 0)
+        ratio = np.where(sold, np.abs(error) / np.where(sold, actual, 1), 0.0)
+        mape = 100 * ratio.sum(axis=axis) / sold.sum(axis=axis)
+
+    def value(metric, index):
+        metric = metric[index]
+        return None if np.isnan(metric) else round(float(metric), 3)
+
+    return [
+        {'mae': value(mae, i), 'mape': value(mape, i), 'bias': value(bias, i), 'samples': int(samples[i])}
+        for i in np.ndindex(samples.shape)
+    ]
+
+
+class Backtester:
+    """Rolling-origin backtest of a predictor's backend and strategy
+
+    Each fold moves the forecast origin `step` days further back: every item
+    is retrained on the days before the origin and forecasts the `horizon`
+    days after it, so a fold never trains on the days it is scored on. Items
+    are evaluated in parallel, and features come from the predictor's shared
+    feature set of the frame. The report is cached per set of trained models
+    (the predictor's version) and strategy, and an item's folds are only
+    recomputed when its model changed.
+    """
+
+    def __init__(self, horizon=None, folds=None, step=7):
+        if horizon is None:
+            horizon = int(os.getenv('BACKTEST_HORIZON', 7))
+        if folds is None:
+            folds = int(os.getenv('BACKTEST_FOLDS', 4))
+        self.horizon = horizon
+        self.folds = folds
+        self.step = step
+        self.results = None
+        self._key = None
+        # Per-item (key, predicted, actual) of the last run
+        self._outcomes = {}
+        self._lock = threading.Lock()
+
+    def origins(self, days):
+        """Day indexes of the fold origins (oldest first) in a history of `days` days"""
+        last = days - self.horizon
+        return [origin for origin in range(last - (self.folds - 1) * self.step, last + 1, self.step)
+                if origin > 0]
+
+    def run(self, predictor, df, progress=None):
+        """Backtest report of the predictor's models on `df`, reused while they are unchanged"""
+        key = (predictor.version, predictor.backend, predictor.strategy, self.horizon, self.folds, self.step)
+        with self._lock:
+            if self._key == key and self.results is not None:
+                return self.results
+
+            progress = progress or Progress()
+            start_time = time.perf_counter()
+            features = predictor.features.get(df)
+            matrix = features.matrix
+            origins = self.origins(len(matrix.dates))
+            calendars = np.array([horizon_calendar(matrix.dates[origin - 1], self.horizon)[1]
+                                  for origin in origins]).reshape(len(origins), self.horizon, 3)
+
+            # Items the predictor has a model for, in history order
+            items = [item for item in features.items if item in predictor.models]
+            progress.start('backtest', total=len(items))
+            outcomes = {}
+            pending = []
+            for item in items:
+                # The model version covers the item's history and the backend
+                item_key = (predictor.model_versions.get(item), predictor.strategy, str(matrix.dates[-1]),
+                            self.horizon, self.folds, self.step)
+                cached = self._outcomes.get(item)
+                if cached is not None and cached[0] == item_key:
+                    outcomes[item] = cached
+                else:
+                    pending.append((item, item_key))
+            progress.advance('backtest', len(outcomes))
+
+            jobs = []
+            for item, _ in pending:
+                item_data = features.item_frame(item)
+                jobs.append(delayed(_backtest_item)(
+                    item_data[FEATURE_COLUMNS].to_numpy(dtype=float), item_data['quantity'].to_numpy(),
+                    matrix.day_indexes(item), origins, calendars,
+                    predictor.backend, predictor.strategy
+                ))
+            fitted = Parallel(n_jobs=predictor.n_jobs)(jobs) if jobs else []
+            for (item, item_key), (item_predicted, item_actual) in zip(pending, fitted):
+                outcomes[item] = (item_key, item_predicted, item_actual)
+            progress.advance('backtest', len(pending))
+            self._outcomes = outcomes
+
+            shape = (len(items), len(origins), self.horizon)
+            predicted = np.array([outcomes[item][1] for item in items]).reshape(shape)
+            actual = np.array([outcomes[item][2] for item in items]).reshape(shape)
+
+            overall, = _error_metrics(predicted.reshape(1, -1), actual.reshape(1, -1), axis=1)
+            by_horizon = _error_metrics(predicted, actual, axis=(0, 1))
+            by_item = _error_metrics(predicted, actual, axis=(1, 2))
+            self.results = {
+                'backend': predictor.backend,
+                'strategy': predictor.strategy,
+                'model_version': predictor.version,
+                'horizon': self.horizon,
+                # First forecast day of each fold
+                'origins': [matrix.dates[origin].strftime('%Y-%m-%d') for origin in origins],
+                'overall': overall,
+                'by_horizon': [{'days_ahead': day + 1, **metrics} for day, metrics in enumerate(by_horizon)],
+                'items': dict(zip(items, by_item)),
+                'recomputed': len(pending),
+                'seconds': round(time.perf_counter() - start_time, 3),
+            }
+            self._key = key
+            progress.finish('backtest')
+            return self.results
@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+
+from app.services.item_index import group_rows
+
+SUMMARY_COLUMNS = ['avg_daily_qty', 'std_qty', 'min_qty', 'max_qty',
+                   'total_qty', 'total_sales', 'avg_daily_sales']
+
+
+class DailyMatrix:
+    """Dense item x calendar-day quantities and sales of a history frame
+
+    Reports only list the items sold that day, so a missing (item, day) is a
+    day without sales: every item's row is zero-filled from its first sale to
+    the last date of the history, and `observed` marks the cells that came
+    from a report. A day without any report (a failed download, a late upload
+    or the restaurant being closed) is not a day without sales: `reported`
+    marks the days with one, and an item's active range is its reported days
+    from its first sale on. Lags and windows are counted in calendar days
+    rather than rows, skipping unreported days, and all of them are axis
+    operations on the matrix.
+    """
+
+    def __init__(self, df):
+        _, slices = group_rows(df['item_name'])
+        self.items = list(slices)
+        self._rows = {item: row for row, item in enumerate(self.items)}
+
+        named = df['item_name'].notna().to_numpy()
+        if named.any():
+            first_date, last_date = df['date'][named].min(), df['date'][named].max()
+        else:
+            first_date = last_date = pd.Timestamp(0)
+        self.dates = pd.date_range(first_date, last_date, freq='D')
+
+        # Flat (item, day) cell of every named row; duplicate cells are summed
+        row_index = pd.Categorical(df['item_name'][named], categories=self.items).codes.astype(np.int64)
+        day_index = ((df['date'][named] - first_date).dt.days).to_numpy()
+        cells = row_index * len(self.dates) + day_index
+        shape = (len(self.items), len(self.dates))
+        size = shape[0] * shape[1]
+
+        self.quantity = np.bincount(cells, weights=df['quantity'][named].to_numpy(dtype=float),
+                                    minlength=size).reshape(shape)
+        self.sales = np.bincount(cells, weights=df['sales'][named].to_numpy(dtype=float),
+                                 minlength=size).reshape(shape)
+        self.observed = np.bincount(cells, minlength=size).reshape(shape) > 0
+        self.reported = self.observed.any(axis=0)
+        # Last reported day on or before each day (the first day always is)
+        self._last_reported = np.maximum.accumulate(np.where(self.reported, np.arange(len(self.dates)), 0))
+
+        # First day of each item's active range
+        self.first = np.where(self.observed.any(axis=1), self.observed.argmax(axis=1), 0)
+        self.active = (np.arange(len(self.dates))[None, :] >= self.first[:, None]) & self.reported
+
+        for matrix in (self.quantity, self.sales, self.observed, self.reported, self.active):
+            matrix.flags.writeable = False
+
+    def __contains__(self, item):
+        return item in self._rows
+
+    def series(self, item, column='quantity'):
+        """An item's daily values over its active range, i.e. its reported days (empty if unknown)"""
+        row = self._rows.get(item)
+        if row is None:
+            return np.empty(0)
+        return getattr(self, column)[row, self.active[row]]
+
+    def day_indexes(self, item):
+        """Day indexes (into `dates`) of the values returned by series()"""
+        row = self._rows.get(item)
+        if row is None:
+            return np.empty(0, dtype=np.int64)
+        return np.nonzero(self.active[row])[0]
+
+    def rolling_mean(self, window, column='quantity'):
+        """Mean of each day and the `window - 1` days before it over the reported days of the active range"""
+        values = getattr(self, column)
+        totals = np.zeros((values.shape[0], values.shape[1] + 1))
+        np.cumsum(values, axis=1, out=totals[:, 1:])
+        counts = np.concatenate([[0], np.cumsum(self.reported)])
+        ends = np.arange(1, values.shape[1] + 1)[None, :]
+        starts = np.maximum(ends - window, self.first[:, None])
+        return ((totals[:, 1:] - np.take_along_axis(totals, starts, axis=1))
+                / np.maximum(counts[ends] - counts[starts], 1))
+
+    def lag(self, days, column='quantity'):
+        """Value `days` calendar days earlier (0 before the item's active range)
+
+        An unreported day takes the value of the last reported day before it.
+        """
+        values = getattr(self, column)[:, self._last_reported]
+        shifted = np.zeros_like(values)
+        if days < values.shape[1]:
+            shifted[:, days:] = values[:, :values.shape[1] - days]
+        return shifted
+
+    def stats(self):
+        """Per-item summary statistics over the active range (reported days without sales count as 0)"""
+        days = self.active.sum(axis=1)
+        total_qty = self.quantity.sum(axis=1)
+        total_sales = self.sales.sum(axis=1)
+        mean_qty = total_qty / np.maximum(days, 1)
+
+        # Sample standard deviation (like pandas), undefined for a single day
+        squares = np.where(self.active, (self.quantity - mean_qty[:, None]) ** 2, 0.0).sum(axis=1)
+        std_qty = np.full(len(self.items), np.nan)
+        np.divide(squares, days - 1, out=std_qty, where=days > 1)
+        std_qty = np.sqrt(std_qty)
+
+        stats = pd.DataFrame({
+            'avg_daily_qty': mean_qty,
+            'std_qty': std_qty,
+            'min_qty': np.where(self.active, self.quantity, np.inf).min(axis=1, initial=np.inf),
+            'max_qty': np.where(self.active, self.quantity, -np.inf).max(axis=1, initial=-np.inf),
+            'total_qty': total_qty,
+            'total_sales': total_sales,
+            'avg_daily_sales': total_sales / np.maximum(days, 1),
+        }, index=pd.Index(self.items, name='item_name'), columns=SUMMARY_COLUMNS)
+        return stats.round(2)
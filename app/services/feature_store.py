@@ -0,0 +1,146 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from app.services.daily_matrix import DailyMatrix
+
+# Features used by the per-item models
+FEATURE_COLUMNS = [
+    'day_of_week',
+    'month',
+    'is_weekend',
+    'qty_7day_avg',
+    'qty_30day_avg',
+    'qty_prev_day',
+    'qty_prev_week'
+]
+
+
+class FeatureSet:
+    """Model features of one history frame, computed once and shared read-only
+
+    Built on the frame's DailyMatrix, so the lags and rolling averages are
+    counted in calendar days (days without sales are zeros, days without a
+    report are skipped) and computed for all items at once as axis
+    operations. Training rows are the days of each item's active range, in
+    date order. Neither the source frame nor the
+    returned frames and arrays may be modified.
+    """
+
+    def __init__(self, df):
+        self.source = df
+        self.rows = len(df)
+        self.matrix = DailyMatrix(df)
+        self.items = self.matrix.items
+        self._frame = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _calendar(dates):
+        day_of_week = dates.dayofweek.to_numpy()
+        return {
+            'day_of_week': day_of_week,
+            'month': dates.month.to_numpy(),
+            'is_weekend': np.isin(day_of_week, [5, 6]).astype(int),
+        }
+
+    def _history(self):
+        """History feature matrices (item x day) in FEATURE_COLUMNS order"""
+        matrix = self.matrix
+        return {
+            'qty_7day_avg': matrix.rolling_mean(7),
+            'qty_30day_avg': matrix.rolling_mean(30),
+            'qty_prev_day': matrix.lag(1),
+            'qty_prev_week': matrix.lag(7),
+        }
+
+    @property
+    def frame(self):
+        """Features, date and quantity of every active (item, day), item by item
+
+        Built on first use (prediction only needs the daily quantities).
+        """
+        with self._lock:
+            if self._frame is None:
+                matrix = self.matrix
+                active = matrix.active
+                days = np.nonzero(active)[1]
+                columns = {name: values[days] for name, values in self._calendar(matrix.dates).items()}
+                columns.update({name: values[active] for name, values in self._history().items()})
+                columns['date'] = matrix.dates.to_numpy()[days]
+                columns['quantity'] = matrix.quantity[active]
+                self._frame = pd.DataFrame(columns)
+
+                stops = np.cumsum(active.sum(axis=1))
+                self._slices = {
+                    item: (int(stop - count), int(stop))
+                    for item, stop, count in zip(self.items, stops, active.sum(axis=1))
+                }
+            return self._frame
+
+    def item_frame(self, item):
+        """Features and quantity of an item's active days, in date order (empty if unknown)"""
+        frame = self.frame
+        start, stop = self._slices.get(item, (0, 0))
+        return frame.iloc[start:stop]
+
+    def quantities(self, item):
+        """An item's daily quantities over its active range (days without a report left out)"""
+        return self.matrix.series(item)
+
+    def aligned(self):
+        """FEATURE_COLUMNS of the source frame's rows, in its order and index
+
+        Each row gets the features of its (item, day) cell; rows without an
+        item name only get the calendar features (history features are 0).
+        """
+        matrix = self.matrix
+        dates = pd.DatetimeIndex(self.source['date'].to_numpy())
+        features = pd.DataFrame(self._calendar(dates), index=self.source.index)
+
+        rows = pd.Categorical(self.source['item_name'], categories=self.items).codes
+        named = rows >= 0
+        days = (dates - matrix.dates[0]).days.to_numpy()
+        for name, values in self._history().items():
+            column = np.zeros(self.rows)
+            column[named] = values[rows[named], days[named]]
+            features[name] = column
+        return features[FEATURE_COLUMNS]
+
+
+class FeatureStore:
+    """Feature sets of the most recent history frames, built once per frame
+
+    A new data load produces a new frame, so each data version is featurized
+    once and then shared by training, prediction and analysis. Keeps the last
+    `size` frames (the one being refreshed and the one being served).
+    """
+
+    def __init__(self, size=2):
+        self.size = size
+        self._sets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, df):
+        """The feature set of a frame, computed on first use"""
+        with self._lock:
+            features = self._sets.get(id(df))
+            if features is not None and features.source is df and features.rows == len(df):
+                self._sets.move_to_end(id(df))
+                return features
+
+            features = FeatureSet(df)
+            self._sets[id(df)] = features
+            while len(self._sets) > self.size:
+                self._sets.popitem(last=False)
+            return features
+
+    def clear(self):
+        with self._lock:
+            self._sets.clear()
+
+
+# Shared by the predictor and the analyzer
+feature_store = FeatureStore()
@@ -0,0 +1,47 @@
+import numpy as np
+from sklearn.base import BaseEstimator, RegressorMixin
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.linear_model import Ridge
+
+
+class WeekdayMean(RegressorMixin, BaseEstimator):
+    """Seasonal baseline: the item's mean quantity on each day of the week
+
+    Only the day-of-week feature (the first column) is used. It is compared
+    as given, so the model works on scaled features like the other backends;
+    a day never seen in training falls back to the overall mean.
+    """
+
+    def fit(self, X, y):
+        days = np.asarray(X, dtype=float)[:, 0]
+        y = np.asarray(y, dtype=float)
+        self.days_, inverse = np.unique(days, return_inverse=True)
+        self.means_ = np.bincount(inverse, weights=y) / np.bincount(inverse)
+        self.mean_ = float(y.mean())
+        return self
+
+    def predict(self, X):
+        days = np.asarray(X, dtype=float)[:, 0]
+        position = np.clip(np.searchsorted(self.days_, days), 0, len(self.days_) - 1)
+        known = np.isclose(self.days_[position], days)
+        return np.where(known, self.means_[position], self.mean_)
+
+
+# Per-item model backends: name -> (signature, factory). The signature is part
+# of the saved-model fingerprint, so changing a backend's parameters (or
+# switching backends) retrains instead of reusing saved models.
+BACKENDS = {
+    'random_forest': (
+        'random_forest:n_estimators=100:random_state=42',
+        # Single-threaded: parallelism is across items
+        lambda: RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=1),
+    ),
+    'ridge': (
+        'ridge:alpha=1.0',
+        lambda: Ridge(alpha=1.0),
+    ),
+    'weekday_mean': (
+        'weekday_mean',
+        WeekdayMean,
+    ),
+}
@@ -0,0 +1,175 @@
+import json
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime
+import pandas as pd
+
+# pyarrow is optional: without it the snapshot store is disabled
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    pa = None
+    feather = None
+
+# Version 2 snapshots hold the compact history layout (see
+# SalesAnalyzer._compact_history), so they are used as loaded; older ones are
+# rebuilt rather than converted (a copy per worker) on every load
+MANIFEST_VERSION = 2
+
+# Snapshot directories without a manifest are still being written by some
+# worker, unless older than this (left behind by a crashed one)
+STALE_SNAPSHOT_SECONDS = 3600
+
+
+class HistoryStore:
+    """On-disk columnar snapshot of the parsed sales history
+
+    Each snapshot is a directory holding the standardized history and the raw
+    per-blob rows as uncompressed Feather (Arrow IPC) files, plus a manifest of
+    the source blob fingerprints it was built from. A CURRENT file points at the
+    latest snapshot and is swapped atomically, so several workers can share the
+    directory. Snapshots are memory-mapped on load, which lets numeric columns
+    be backed by the page cache instead of a private copy per worker.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    @property
+    def available(self):
+        return feather is not None and self.directory is not None
+
+    def _current_path(self):
+        return os.path.join(self.directory, 'CURRENT')
+
+    def load(self, aliases=None):
+        """Load the latest snapshot as (history_df, raw_reports, fingerprints), or None
+
+        A snapshot standardized with another item alias table (`aliases` is its
+        version) is not reused.
+        """
+        if not self.available:
+            return None
+
+        try:
+            with open(self._current_path()) as f:
+                snapshot_dir = os.path.join(self.directory, f.read().strip())
+            with open(os.path.join(snapshot_dir, 'manifest.json')) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if manifest.get('version') != MANIFEST_VERSION or manifest.get('aliases') != aliases:
+            return None
+
+        history_df = self._read_frame(os.path.join(snapshot_dir, 'history.feather'))
+        raw_df = self._read_frame(os.path.join(snapshot_dir, 'raw.feather'))
+
+        # Split the raw rows back into one frame per source blob
+        raw_reports = {name: None for name in manifest['blobs']}
+        for name, menu_items in raw_df.groupby('source_blob', sort=False):
+            raw_reports[name] = menu_items.drop(columns='source_blob').reset_index(drop=True)
+
+        fingerprints = {name: tuple(fingerprint) for name, fingerprint in manifest['blobs'].items()}
+
+        print(f"Loaded history snapshot {os.path.basename(snapshot_dir)} "
+              f"({len(history_df)} rows from {len(fingerprints)} reports)")
+        return history_df, raw_reports, fingerprints
+
+    def save(self, history_df, raw_reports, fingerprints, aliases=None):
+        """Write a new snapshot and make it the current one
+
+        Snapshots older than the previous current one are deleted, except ones
+        another worker is still writing. A snapshot that fails to write is
+        removed and the error raised.
+        """
+        if not self.available:
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        snapshot_name = f"snapshot-{datetime.now().strftime('%Y%m%d%H%M%S%f')}-{uuid.uuid4().hex[:8]}"
+        snapshot_dir = os.path.join(self.directory, snapshot_name)
+        os.makedirs(snapshot_dir)
+        try:
+            previous = self._write_snapshot(snapshot_name, history_df, raw_reports, fingerprints, aliases)
+        except Exception:
+            shutil.rmtree(snapshot_dir, ignore_errors=True)
+            raise
+
+        # Names start with their creation time, so they sort oldest first
+        if previous is not None:
+            for entry in os.listdir(self.directory):
+                if entry.startswith('snapshot-') and entry < previous and entry != snapshot_name:
+                    self._remove_finished(os.path.join(self.directory, entry))
+
+        print(f"Saved history snapshot {snapshot_name}")
+
+    def _write_snapshot(self, snapshot_name, history_df, raw_reports, fingerprints, aliases):
+        """Write a snapshot's files and point CURRENT at it, returning the previous current snapshot"""
+        snapshot_dir = os.path.join(self.directory, snapshot_name)
+
+        # Raw rows of all reports in one table, tagged with their source blob
+        raw_frames = [
+            menu_items.assign(source_blob=name)
+            for name, menu_items in raw_reports.items()
+            if menu_items is not None and not menu_items.empty
+        ]
+        if raw_frames:
+            raw_df = pd.concat(raw_frames, ignore_index=True)
+        else:
+            raw_df = pd.DataFrame({'source_blob': pd.Series(dtype='object')})
+
+        self._write_frame(history_df, os.path.join(snapshot_dir, 'history.feather'))
+        self._write_frame(raw_df, os.path.join(snapshot_dir, 'raw.feather'))
+
+        manifest = {
+            'version': MANIFEST_VERSION,
+            'created': datetime.now().isoformat(),
+            'rows': len(history_df),
+            'aliases': aliases,
+            'blobs': {name: list(fingerprint) for name, fingerprint in fingerprints.items()},
+        }
+        with open(os.path.join(snapshot_dir, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f)
+
+        try:
+            with open(self._current_path()) as f:
+                previous = f.read().strip() or None
+        except OSError:
+            previous = None
+
+        # Atomically point CURRENT at the new snapshot. The previous one is
+        # kept for workers that read CURRENT just before; workers still mapping
+        # an older snapshot keep reading the unlinked files.
+        tmp_path = f"{self._current_path()}.{uuid.uuid4().hex}"
+        with open(tmp_path, 'w') as f:
+            f.write(snapshot_name)
+        os.replace(tmp_path, self._current_path())
+        return previous
+
+    @staticmethod
+    def _remove_finished(snapshot_dir):
+        """Delete a snapshot directory unless another worker is still writing it"""
+        try:
+            finished = os.path.exists(os.path.join(snapshot_dir, 'manifest.json'))
+            if not finished and time.time() - os.path.getmtime(snapshot_dir) < STALE_SNAPSHOT_SECONDS:
+                return
+        except OSError:
+            return
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+
+    @staticmethod
+    def _write_frame(df, path):
+        table = pa.Table.from_pandas(df.reset_index(drop=True), preserve_index=False)
+        # Uncompressed so the file can be memory-mapped without decoding
+        feather.write_feather(table, path, compression='uncompressed')
+
+    @staticmethod
+    def _read_frame(path):
+        table = feather.read_table(path, memory_map=True)
+        # split_blocks avoids consolidating columns, so numeric columns can stay
+        # zero-copy views of the mapped file
+        return table.to_pandas(split_blocks=True)
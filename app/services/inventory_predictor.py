@@ -3,13 +3,159 @@ from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
+from datetime import datetime
 import openai
 from dotenv import load_dotenv
 import os
+import hashlib
+import threading
+from joblib import Parallel, delayed
+from app.services.model_registry import ModelRegistry
+from app.services.model_store import ModelStore
+from app.services.refresh_job import Progress
+from app.services.feature_store import FEATURE_COLUMNS, feature_store
+from app.services.forecast_models import BACKENDS
+
+def model_signature(backend):
+    """Signature of a backend's models and features, part of saved-model fingerprints
+    
+    Changes to the features or model parameters must change it so that
+    persisted models are retrained (models are fitted on plain arrays of
+    calendar-day features, on all days after a time-ordered holdout score).
+    """
+    return f"{BACKENDS[backend][0]}:array:daily:refit:{','.join(FEATURE_COLUMNS)}"
+
+MODEL_SIGNATURE = model_signature('random_forest')
+
+# Forecasting strategies: "static" reuses the history features of the last
+# observed day for the whole horizon, "recursive" feeds each prediction back
+# into the lag and rolling features before predicting the next day
+STRATEGIES = ('static', 'recursive')
+
+class RollingWindow:
+    """Ring buffer of the most recent daily quantities with O(1) lag/rolling features"""
+    
+    def __init__(self, history, size=30):
+        self.size = size
+        self.buffer = np.zeros(size)
+        self.position = 0
+        self.count = 0
+        self.sum_7 = 0.0
+        self.sum_30 = 0.0
+        for value in history[-size:]:
+            self.push(value)
+    
+    def lag(self, days):
+        """Quantity `days` days before the next day (1 = most recent)"""
+        return self.buffer[(self.position - days) % self.size]
+    
+    def push(self, value):
+        """Append a day's quantity, updating the running window sums"""
+        if self.count >= 7:
+            self.sum_7 -= self.lag(7)
+        if self.count >= 30:
+            self.sum_30 -= self.lag(30)
+        self.buffer[self.position] = value
+        self.position = (self.position + 1) % self.size
+        self.count += 1
+        self.sum_7 += value
+        self.sum_30 += value
+    
+    def features(self):
+        """History features in FEATURE_COLUMNS order: 7/30 day averages, previous day/week"""
+        return (
+            self.sum_7 / min(self.count, 7),
+            self.sum_30 / min(self.count, 30),
+            self.lag(1),
+            self.lag(7) if self.count >= 7 else 0
+        )
+    
+    def copy(self):
+        """Independent window with the same state, to continue a forecast later"""
+        window = RollingWindow([], self.size)
+        window.buffer = self.buffer.copy()
+        window.position = self.position
+        window.count = self.count
+        window.sum_7 = self.sum_7
+        window.sum_30 = self.sum_30
+        return window
+
+def horizon_calendar(last_date, days):
+    """Dates and calendar features (FEATURE_COLUMNS order) of the `days` days after `last_date`"""
+    future_dates = last_date + pd.to_timedelta(np.arange(1, days + 1), unit='D')
+    calendar = np.column_stack([
+        future_dates.dayofweek,
+        future_dates.month,
+        (future_dates.dayofweek >= 5).astype(int)
+    ]).astype(float)
+    return future_dates, calendar
+
+def fit_scaled(X, y, backend='random_forest'):
+    """Fit a scaler and a backend's model (see forecast_models.BACKENDS) on feature arrays"""
+    scaler = StandardScaler()
+    model = BACKENDS[backend][1]()
+    model.fit(scaler.fit_transform(X), y)
+    return model, scaler
+
+def forecast_static(model, scaler, history, calendar):
+    """Predict a horizon in one batch, holding history features at their last observed values"""
+    # History features are the same for every day of the horizon
+    history_features = np.array([
+        history[-7:].mean(),
+        history[-30:].mean(),
+        history[-1],
+        history[-7] if len(history) > 7 else 0
+    ])
+    X = np.hstack([calendar, np.tile(history_features, (len(calendar), 1))])
+    
+    # One transform and one predict call for the whole horizon
+    return model.predict(scaler.transform(X))
+
+def forecast_recursive(model, scaler, window, calendar):
+    """Predict day by day, pushing each prediction into the rolling window"""
+    predicted = np.empty(len(calendar))
+    row = np.empty((1, len(FEATURE_COLUMNS)))
+    for day, calendar_features in enumerate(calendar):
+        row[0, :3] = calendar_features
+        row[0, 3:] = window.features()
+        # Scale in place with the fitted statistics (same as scaler.transform)
+        row_scaled = (row - scaler.mean_) / scaler.scale_
+        predicted[day] = model.predict(row_scaled)[0]
+        window.push(max(0.0, predicted[day]))
+    
+    return predicted
+
+def _fit_item_model(X, y, backend='random_forest'):
+    """Fit one item's scaler and model (see forecast_models.BACKENDS), returning (model, scaler, metrics)
+    
+    The test score is of a model fitted on all but the most recent 20% of
+    days and tested on those (a shuffled split would train on days after the
+    ones it is tested on); the returned model is then refitted on every day,
+    so forecasts follow the latest sales. Module level so it can run in a
+    joblib worker process. Errors are returned in the metrics instead of
+    raised so one item cannot fail the whole run.
+    """
+    try:
+        # Plain arrays, which is also what predict passes in
+        X, y = X.to_numpy(dtype=float), y.to_numpy()
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, shuffle=False)
+        
+        holdout_model, holdout_scaler = fit_scaled(X_train, y_train, backend)
+        test_score = holdout_model.score(holdout_scaler.transform(X_test), y_test)
+        
+        model, scaler = fit_scaled(X, y, backend)
+        metrics = {
+            'train_score': float(model.score(scaler.transform(X), y)),
+            'test_score': float(test_score)
+        }
+        return model, scaler, metrics
+        
+    except Exception as e:
+        return None, None, {'error': str(e)}
 
 class InventoryPredictor:
-    def __init__(self):
+    def __init__(self, model_dir=None, n_jobs=None, strategy=None, features=None, backend=None,
+                 model_memory=None):
         # Load environment variables
         load_dotenv()
         
@@ -26,183 +172,278 @@ class InventoryPredictor:
         
         self.openai = openai.OpenAI(api_key=openai_key)
         
-        # Cache for predictions
+        # Per-item prediction cache keyed on (item, strategy). Entries record the
+        # model and data versions they were computed from and are only reused
+        # while both match; a longer horizon extends the cached shorter one.
         self._predictions_cache = {}
-        self._last_prediction_time = {}
-        self._prediction_cache_expiry = timedelta(hours=1)  # Refresh predictions every hour
+        self._history_index = None
+        self.cache_stats = {'hits': 0, 'extended': 0, 'misses': 0}
+        # Guards the prediction cache when predict runs on several request threads
+        self._cache_lock = threading.Lock()
         
-    def prepare_features(self, df):
-        """Prepare features for ML model"""
-        # Create time-based features
-        df['day_of_week'] = df['date'].dt.dayofweek
-        df['month'] = df['date'].dt.month
-        df['is_weekend'] = df['date'].dt.dayofweek.isin([5, 6]).astype(int)
-        
-        # Calculate rolling averages
-        df['qty_7day_avg'] = df.groupby('item_name')['quantity'].transform(
-            lambda x: x.rolling(window=7, min_periods=1).mean()
-        )
-        df['qty_30day_avg'] = df.groupby('item_name')['quantity'].transform(
-            lambda x: x.rolling(window=30, min_periods=1).mean()
-        )
+        # Trained models are persisted so unchanged items skip retraining on startup
+        if model_dir is None:
+            model_dir = os.getenv('MODEL_DIR')
+        self.registry = ModelRegistry(model_dir)
+        # Item -> (model, scaler), loaded lazily and kept within a memory budget
+        self.models = ModelStore(self.registry, budget=model_memory)
+        self.model_versions = {}
+        self.training_results = {}
+        # Identifies the whole set of trained models; None until trained
+        self.version = None
+        
+        # Worker processes for training (-1 uses every core)
+        if n_jobs is None:
+            n_jobs = int(os.getenv('TRAINING_JOBS', -1))
+        self.n_jobs = n_jobs
+        
+        # Default forecasting strategy (see STRATEGIES)
+        if strategy is None:
+            strategy = os.getenv('FORECAST_STRATEGY', 'static')
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown forecasting strategy: {strategy}")
+        self.strategy = strategy
+        
+        # Per-item model backend (see forecast_models.BACKENDS)
+        if backend is None:
+            backend = os.getenv('FORECAST_BACKEND', 'random_forest')
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown model backend: {backend}")
+        self.backend = backend
         
-        # Add lag features
-        df['qty_prev_day'] = df.groupby('item_name')['quantity'].shift(1)
-        df['qty_prev_week'] = df.groupby('item_name')['quantity'].shift(7)
+        # Features are computed once per history frame and shared with the
+        # analyzer (see feature_store.py)
+        self.features = features if features is not None else feature_store
         
-        # Fill NaN values
-        df = df.fillna({
-            'qty_prev_day': 0,
-            'qty_prev_week': 0,
-            'qty_7day_avg': 0,
-            'qty_30day_avg': 0
-        })
+    def prepare_features(self, df):
+        """Copy of `df` with the model features added (`df` itself is not modified)"""
+        return df.assign(**self.features.get(df).aligned())
         
-        return df
+    def train(self, df, progress=None):
+        """Train the model on historical data
         
-    def train(self, df):
-        """Train the model on historical data"""
+        Items are fitted in parallel (one process per item partition) and
+        unchanged items reuse their saved model, which is only loaded when
+        first predicted (see model_store.ModelStore). Returns a dict of per-item
+        results with status, sample count and train/test R² scores, which is
+        also kept in `training_results`. `progress` counts items as they are
+        done (see refresh_job.Progress).
+        """
         print("Training inventory prediction model...")
+        start_time = datetime.now()
+        progress = progress or Progress()
         
-        # Prepare features
-        df = self.prepare_features(df)
-        
-        # Features for training
-        feature_columns = [
-            'day_of_week',
-            'month',
-            'is_weekend',
-            'qty_7day_avg',
-            'qty_30day_avg',
-            'qty_prev_day',
-            'qty_prev_week'
-        ]
-        
-        # Train a separate model for each menu item
-        self.models = {}
-        self.scalers = {}
-        
-        # Filter out null item names
-        valid_items = df['item_name'].dropna().unique()
-        
-        for item in valid_items:  # Changed from df['item_name'].unique()
-            print(f"Training model for: {item}")
-            item_data = df[df['item_name'] == item]
-            
+        # Features come from the shared store (the caller's frame may be shared
+        # with requests running on other threads and is never modified)
+        features = self.features.get(df)
+        progress.start('train', total=len(features.items))
+        
+        results = {}
+        models = {}
+        model_versions = {}
+        pending = []
+        
+        # One partition per item: the days of its active range (see DailyMatrix)
+        for item in features.items:
+            item_data = features.item_frame(item)
             # Skip if not enough data
             if len(item_data) < 10:  # Minimum required samples
-                print(f"Skipping {item} - insufficient data")
+                results[item] = {'status': 'skipped', 'samples': len(item_data)}
                 continue
             
-            X = item_data[feature_columns]
+            X = item_data[FEATURE_COLUMNS]
             y = item_data['quantity']
             
+            # Reuse the persisted model when the item's training data is unchanged
+            fingerprint = ModelRegistry.fingerprint(item, X, y, model_signature(self.backend))
+            if self.registry.get_fingerprint(item) == fingerprint:
+                model_versions[item] = fingerprint
+                results[item] = {
+                    'status': 'loaded',
+                    'samples': len(item_data),
+                    **self.registry.get_metrics(item)
+                }
+                continue
+            
+            pending.append((item, fingerprint, X, y))
+        
+        progress.advance('train', len(results))
+        # Fit the remaining items across cores
+        fitted = Parallel(n_jobs=self.n_jobs)(
+            delayed(_fit_item_model)(X, y, self.backend) for _, _, X, y in pending
+        )
+        
+        for (item, fingerprint, X, _), (model, scaler, metrics) in zip(pending, fitted):
+            if model is None:
+                results[item] = {'status': 'failed', 'samples': len(X), **metrics}
+                continue
+            
+            models[item] = (model, scaler)
+            model_versions[item] = fingerprint
             try:
-                # Split data
-                X_train, X_test, y_train, y_test = train_test_split(
-                    X, y, test_size=0.2, random_state=42
-                )
-                
-                # Scale features
-                scaler = StandardScaler()
-                X_train_scaled = scaler.fit_transform(X_train)
-                X_test_scaled = scaler.transform(X_test)
-                
-                # Train model
-                model = RandomForestRegressor(n_estimators=100, random_state=42)
-                model.fit(X_train_scaled, y_train)
-                
-                # Store model and scaler
-                self.models[item] = model
-                self.scalers[item] = scaler
-                
-                # Print model performance
-                train_score = model.score(X_train_scaled, y_train)
-                test_score = model.score(X_test_scaled, y_test)
-                print(f"  Train R² score: {train_score:.3f}")
-                print(f"  Test R² score: {test_score:.3f}")
-                
+                self.registry.save(item, model, scaler, fingerprint, metrics)
             except Exception as e:
-                print(f"Error training model for {item}: {str(e)}")
-                continue
+                # Served from memory (not evicted, as it cannot be reloaded)
+                print(f"Error saving model for {item}: {str(e)}")
+            results[item] = {'status': 'trained', 'samples': len(X), **metrics}
+        progress.advance('train', len(pending))
         
-        # Clear prediction cache after retraining
-        self.clear_prediction_cache()
+        # Swap in the new models together (predict sees either the old or the
+        # new set, never a mix) and drop cached predictions only for items
+        # whose model changed
+        with self._cache_lock:
+            self.models.replace(model_versions, models)
+            self.model_versions = model_versions
+            self.training_results = results
+            self.version = hashlib.sha1(
+                repr(sorted(model_versions.items())).encode('utf-8')
+            ).hexdigest()[:16]
+            
+            for item, strategy in list(self._predictions_cache):
+                if self._predictions_cache[(item, strategy)]['model_version'] != model_versions.get(item):
+                    del self._predictions_cache[(item, strategy)]
+        
+        statuses = [result['status'] for result in results.values()]
+        elapsed = (datetime.now() - start_time).total_seconds()
+        print(f"Trained {statuses.count('trained')} models, reused {statuses.count('loaded')}, "
+              f"skipped {statuses.count('skipped')}, failed {statuses.count('failed')} "
+              f"in {elapsed:.1f}s")
+        progress.finish('train')
+        
+        return results
     
-    def predict(self, df, days_ahead=7, force_recalculate=False):
-        """Predict inventory needs for the next n days"""
-        current_time = datetime.now()
-        cache_key = f"days_{days_ahead}"
-        
-        # Check if we have valid cached predictions
-        if not force_recalculate and cache_key in self._predictions_cache and cache_key in self._last_prediction_time:
-            # If cache is still valid (less than cache_expiry old)
-            if current_time - self._last_prediction_time[cache_key] < self._prediction_cache_expiry:
-                print(f"Using cached predictions for {days_ahead} days ahead")
-                return self._predictions_cache[cache_key]
-        
-        print(f"Calculating predictions for {days_ahead} days ahead...")
+    def predict(self, df, days_ahead=7, force_recalculate=False, strategy=None, items=None):
+        """Predict inventory needs for the next n days
+        
+        `strategy` overrides the predictor's default forecasting strategy and
+        `items` limits the forecast to some items (in that order).
+        Cached per-item forecasts are reused while the item's model and recent
+        history are unchanged, and extended when a longer horizon is requested.
+        """
+        strategy = strategy or self.strategy
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown forecasting strategy: {strategy}")
+        if days_ahead < 1:
+            raise ValueError(f"days_ahead must be at least 1, got {days_ahead}")
+        
+        print(f"Calculating {strategy} predictions for {days_ahead} days ahead...")
         predictions = {}
         
         # Get the last date in the dataset
-        last_date = df['date'].max()
+        last_date, quantities, data_versions = self._index_history(df)
         print(f"Last date in dataset: {last_date}")
         
-        # Prepare features for prediction
-        df = self.prepare_features(df)
+        # Calendar features and formatted dates for the whole horizon, shared by all items
+        future_dates, calendar = horizon_calendar(last_date, days_ahead)
+        formatted_dates = future_dates.strftime('%Y-%m-%d').tolist()
         
-        for item in self.models.keys():
-            item_predictions = []
-            current_df = df[df['item_name'] == item].copy()
-            
-            # Predict for each day
-            for i in range(days_ahead):
-                next_date = last_date + timedelta(days=i+1)
-                
-                # Create feature row for prediction
-                pred_features = pd.DataFrame({
-                    'day_of_week': [next_date.dayofweek],
-                    'month': [next_date.month],
-                    'is_weekend': [1 if next_date.dayofweek in [5, 6] else 0],
-                    'qty_7day_avg': [current_df['quantity'].tail(7).mean()],
-                    'qty_30day_avg': [current_df['quantity'].tail(30).mean()],
-                    'qty_prev_day': [current_df['quantity'].iloc[-1]],
-                    'qty_prev_week': [current_df['quantity'].iloc[-7] if len(current_df) > 7 else 0]
-                })
+        # Cache entries are looked up and replaced under the cache lock; the
+        # forecasts run outside it, so concurrent requests only wait for each
+        # other on the same (item, strategy)
+        entries = {}
+        with self._cache_lock:
+            for item in list(self.models) if items is None else items:
+                if item not in self.models or item not in quantities:
+                    continue
                 
-                # Scale features
-                pred_features_scaled = self.scalers[item].transform(pred_features)
-                
-                # Make prediction
-                pred_qty = self.models[item].predict(pred_features_scaled)[0]
-                
-                # Format date as YYYY-MM-DD string for consistent parsing in frontend
-                formatted_date = next_date.strftime('%Y-%m-%d')
-                
-                item_predictions.append({
-                    'date': formatted_date,
-                    'predicted_quantity': max(0, round(pred_qty))  # Ensure non-negative
-                })
-                
-                print(f"Prediction for {item} on {formatted_date}: {max(0, round(pred_qty))}")
-                
-            predictions[item] = item_predictions
+                key = (item, strategy)
+                entry = self._predictions_cache.get(key)
+                if (force_recalculate or entry is None
+                        or entry['model_version'] != self.model_versions.get(item)
+                        or entry['data_version'] != data_versions[item]):
+                    entry = {
+                        'model_version': self.model_versions.get(item),
+                        'data_version': data_versions[item],
+                        'predictions': [],
+                        'window': RollingWindow(quantities[item]) if strategy == 'recursive' else None,
+                        # Held while the entry is extended (single flight per entry)
+                        'lock': threading.Lock()
+                    }
+                    self._predictions_cache[key] = entry
+                    self.cache_stats['misses'] += 1
+                elif len(entry['predictions']) >= days_ahead:
+                    self.cache_stats['hits'] += 1
+                else:
+                    self.cache_stats['extended'] += 1
+                entries[item] = entry
         
-        # Update cache
-        self._predictions_cache[cache_key] = predictions
-        self._last_prediction_time[cache_key] = current_time
+        for item, entry in entries.items():
+            with entry['lock']:
+                # Only the days beyond the cached horizon are predicted (a
+                # concurrent request may have extended the entry meanwhile)
+                cached_days = len(entry['predictions'])
+                if cached_days < days_ahead:
+                    # Loads the item's model if it is not resident; a saved model
+                    # that fails to load is retrained on the next refresh
+                    pair = self.models.get(item)
+                    if pair is None:
+                        with self._cache_lock:
+                            if self._predictions_cache.get((item, strategy)) is entry:
+                                del self._predictions_cache[(item, strategy)]
+                        continue
+                    model, scaler = pair
+                    if strategy == 'recursive':
+                        predicted = forecast_recursive(model, scaler, entry['window'], calendar[cached_days:])
+                    else:
+                        predicted = forecast_static(model, scaler, quantities[item], calendar[cached_days:])
+                    predicted = np.maximum(np.rint(predicted), 0).astype(int).tolist()  # Ensure non-negative
+                    
+                    # Dates are YYYY-MM-DD strings for consistent parsing in frontend
+                    entry['predictions'].extend(
+                        {'date': date, 'predicted_quantity': quantity}
+                        for date, quantity in zip(formatted_dates[cached_days:], predicted)
+                    )
+                
+                predictions[item] = entry['predictions'][:days_ahead]
             
         return predictions
+    
+    def _index_history(self, df):
+        """Return (last_date, per-item quantities, per-item data versions) for a frame
+        
+        An item's data version covers everything its forecast depends on: the
+        last date in the dataset and the item's most recent 30 quantities. The
+        index is reused while predict is called with the same, unchanged frame.
+        """
+        last_date = df['date'].max()
+        # Read and replaced as a whole, so no lock is needed (concurrent first
+        # calls on a new frame may both build the same index)
+        history_index = self._history_index
+        if history_index is not None:
+            indexed_df, indexed_rows, indexed_date, quantities, data_versions = history_index
+            if indexed_df is df and indexed_rows == len(df) and indexed_date == last_date:
+                return last_date, quantities, data_versions
+        
+        # Per-item daily quantities (zero on days without sales, days without
+        # a report left out), shared with training through the feature store
+        features = self.features.get(df)
+        quantities = {item: features.quantities(item) for item in features.items}
+        data_versions = {}
+        for item, history in quantities.items():
+            digest = hashlib.sha1(str(last_date).encode('utf-8'))
+            digest.update(history[-30:].tobytes())
+            data_versions[item] = digest.hexdigest()
+        
+        self._history_index = (df, len(df), last_date, quantities, data_versions)
+        return last_date, quantities, data_versions
+        
+    def get_ai_insights(self, predictions, actual_data, historical_averages=None):
+        """Get OpenAI analysis of predictions
+        
+        `historical_averages` maps items to their average daily quantity (e.g.
+        from the analyzer's item index); otherwise it is computed from
+        `actual_data` in one pass.
+        """
+        if historical_averages is None:
+            historical_averages = actual_data.groupby('item_name', observed=True)['quantity'].mean()
         
-    def get_ai_insights(self, predictions, actual_data):
-        """Get OpenAI analysis of predictions"""
         # Prepare data for analysis
         analysis_text = "Inventory Prediction Analysis:\n\n"
         
         for item, preds in predictions.items():
             analysis_text += f"Item: {item}\n"
             analysis_text += f"Predicted quantities: {[p['predicted_quantity'] for p in preds]}\n"
-            analysis_text += f"Historical average: {actual_data[actual_data['item_name'] == item]['quantity'].mean():.1f}\n\n"
+            analysis_text += f"Historical average: {historical_averages.get(item, np.nan):.1f}\n\n"
         
         prompt = f"""
         Analyze these inventory predictions:
@@ -224,8 +465,17 @@ class InventoryPredictor:
         except Exception as e:
             return f"Error getting AI insights: {str(e)}"
             
+    def get_cache_stats(self):
+        """Prediction cache counters: hits, extended (longer horizon than cached), misses"""
+        return {**self.cache_stats, 'entries': len(self._predictions_cache)}
+    
+    def get_model_stats(self):
+        """Models resident in memory, their size against the memory budget, loads and evictions"""
+        return self.models.report()
+    
     def clear_prediction_cache(self):
         """Clear the prediction cache to force recalculation on next call"""
-        self._predictions_cache = {}
-        self._last_prediction_time = {}
+        with self._cache_lock:
+            self._predictions_cache = {}
+            self._history_index = None
         print("Prediction cache cleared") 
\ No newline at end of file
@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+
+
+def group_rows(item_names):
+    """Stable row order grouping rows by item, and each item's block in that order
+
+    Returns (order, slices). `order` holds the positions of the rows with an
+    item name, grouped by item and in their original order within an item, or
+    is None when the rows are already laid out item by item. `slices` maps
+    every item, in order of first appearance, to its (start, stop) positions.
+    """
+    # Factorized without a sort on the names (missing names get code -1)
+    codes, names = pd.factorize(item_names, sort=False)
+    if len(codes) and (codes[0] < 0 or (np.diff(codes) < 0).any()):
+        order = np.argsort(codes, kind='stable')
+        order = order[int((codes < 0).sum()):]
+    else:
+        order = None
+
+    counts = np.bincount(codes[codes >= 0], minlength=len(names))
+    stops = np.cumsum(counts)
+    starts = stops - counts
+    slices = {
+        name: (int(start), int(stop))
+        for name, start, stop in zip(names, starts, stops)
+    }
+    return order, slices
+
+
+class ItemIndex:
+    """Per-item view of a sales history frame, built once per data load
+
+    Rows are stably reordered so each item's history is one contiguous block
+    (still in date order), and every item maps to its (start, stop) positions.
+    Looking up an item is then a dict lookup plus a positional slice instead
+    of a boolean mask over the whole history. Summary statistics are computed
+    in the same pass and kept per item.
+    """
+
+    def __init__(self, df, stats):
+        self.source = df
+        self.items = df['item_name'].unique().tolist()
+
+        order, self._slices = group_rows(df['item_name'])
+        if order is None and df.index.equals(pd.RangeIndex(len(df))):
+            # Already laid out item by item (see SalesAnalyzer._compact_history): no copy
+            self.frame = df
+        else:
+            self.frame = df.iloc[order if order is not None else slice(None)].reset_index(drop=True)
+        self._dates = self.frame['date'].to_numpy()
+
+        self._stats = stats.to_dict('index')
+        # Date x item tables per value column, built on first use
+        self._tables = {}
+
+    def __contains__(self, item):
+        return item in self._slices
+
+    def rows(self, item):
+        """All rows of an item in date order (empty if the item is unknown)"""
+        start, stop = self._slices.get(item, (0, 0))
+        return self.frame.iloc[start:stop]
+
+    def history(self, item, days=None, start=None, end=None):
+        """The item's rows between `start` and `end` (inclusive), most recent `days` of them
+
+        Each item's rows are date-sorted, so the date bounds are binary searches
+        within the item's block rather than a scan.
+        """
+        lo, hi = self._slices.get(item, (0, 0))
+        dates = self._dates[lo:hi]
+        if end is not None:
+            hi = lo + int(np.searchsorted(dates, np.datetime64(pd.Timestamp(end)), side='right'))
+        if start is not None:
+            lo = lo + int(np.searchsorted(dates, np.datetime64(pd.Timestamp(start)), side='left'))
+        if days is not None:
+            lo = max(lo, hi - max(days, 0))
+        return self.frame.iloc[lo:max(lo, hi)]
+
+    def stats(self, item):
+        """Summary statistics of an item (see SalesAnalyzer.get_summary_stats)"""
+        return self._stats.get(item, {})
+
+    def mean_quantity(self, item):
+        """Average daily quantity of an item, or NaN if the item is unknown"""
+        return self._stats.get(item, {}).get('avg_daily_qty', np.nan)
+
+    def table(self, column):
+        """Date x item table of a value column (NaN where an item has no row)
+
+        Built with a single groupby for all items and reused for the lifetime of
+        the index. Dates are sorted, so date ranges are binary searches.
+        """
+        table = self._tables.get(column)
+        if table is None:
+            table = (self.frame.groupby(['date', 'item_name'], sort=True, observed=True)[column]
+                     .sum().unstack('item_name'))
+            self._tables[column] = table
+        return table
+
+    def history_table(self, column, items=None, start=None, end=None, days=None):
+        """Slice of `table(column)` for some items and a date range
+
+        `start`/`end` are inclusive; `days` keeps only the most recent dates of
+        the range. Unknown items are left out.
+        """
+        table = self.table(column)
+        dates = table.index
+        lo = 0 if start is None else dates.searchsorted(pd.Timestamp(start), side='left')
+        hi = len(dates) if end is None else dates.searchsorted(pd.Timestamp(end), side='right')
+        if days is not None:
+            lo = max(lo, hi - max(days, 0))
+        if items is not None:
+            table = table.reindex(columns=[item for item in dict.fromkeys(items) if item in self._slices])
+        return table.iloc[lo:hi]
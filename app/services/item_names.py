@@ -0,0 +1,71 @@
+import hashlib
+import json
+import os
+import re
+
+import pandas as pd
+
+# Alias table shipped with the app; ITEM_ALIASES_PATH points at another one
+DEFAULT_ALIASES_PATH = os.path.join(os.path.dirname(__file__), 'item_aliases.json')
+
+
+class ItemNameStandardizer:
+    """Maps raw menu item names to their standardized names
+
+    The alias table maps each standard name to the (case-insensitive) aliases
+    it replaces. A name equal to an alias maps directly; otherwise the first
+    alias found as whole words inside the name wins (the longest one when
+    several start at the same position). Every alias is matched by a single
+    precompiled alternation, and each distinct raw name is only resolved once.
+    """
+
+    def __init__(self, aliases):
+        self.aliases = {}
+        for standard_name, names in aliases.items():
+            for alias in names:
+                self.aliases.setdefault(alias.lower().strip(), standard_name)
+
+        # Longest aliases first, so the alternation prefers the most specific one
+        patterns = sorted(self.aliases, key=len, reverse=True)
+        self._pattern = re.compile(
+            r'\b(?:' + '|'.join(re.escape(alias) for alias in patterns) + r')\b'
+        ) if patterns else None
+        self._resolved = {}
+
+        # Identifies the alias table, so data standardized with another one is not reused
+        digest = hashlib.sha1(json.dumps(sorted(self.aliases.items())).encode('utf-8'))
+        self.version = digest.hexdigest()[:16]
+
+    @classmethod
+    def from_file(cls, path=None):
+        """Load the alias table from a JSON file ({standard name: [aliases]})"""
+        if path is None:
+            path = os.getenv('ITEM_ALIASES_PATH', DEFAULT_ALIASES_PATH)
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def standardize(self, name):
+        """Standardized name of one raw name (the raw name itself if no alias matches)"""
+        if pd.isna(name):
+            return name
+        try:
+            return self._resolved[name]
+        except KeyError:
+            pass
+
+        # Convert to lowercase for case-insensitive matching
+        name_lower = str(name).lower().strip()
+        standard_name = self.aliases.get(name_lower)
+        if standard_name is None and self._pattern is not None:
+            match = self._pattern.search(name_lower)
+            if match is not None:
+                standard_name = self.aliases[match.group(0)]
+
+        result = name if standard_name is None else standard_name
+        self._resolved[name] = result
+        return result
+
+    def standardize_series(self, names):
+        """Standardize a Series of names, resolving each distinct name once"""
+        mapping = {name: self.standardize(name) for name in names.dropna().unique()}
+        return names.map(mapping)
@@ -0,0 +1,61 @@
+import base64
+import hashlib
+import os
+from datetime import datetime, timezone
+
+
+class LocalBlob:
+    """Minimal stand-in for google.cloud.storage.Blob backed by a local file"""
+
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.path = os.path.join(bucket.directory, *name.split('/'))
+
+        stat = os.stat(self.path)
+        self.size = stat.st_size
+        self.generation = stat.st_mtime_ns
+        self.updated = datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc)
+
+    @property
+    def md5_hash(self):
+        """Base64 encoded MD5 of the file contents, as reported by GCS"""
+        with open(self.path, 'rb') as f:
+            return base64.b64encode(hashlib.md5(f.read()).digest()).decode('ascii')
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def download_as_bytes(self):
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def download_as_text(self, encoding='utf-8'):
+        return self.download_as_bytes().decode(encoding)
+
+
+class LocalBucket:
+    """Serve report files from a local directory through the GCS bucket interface
+
+    Blob names are paths relative to `directory` using forward slashes, so a
+    directory containing `reports/2024-01-01.csv` behaves like the production
+    bucket. Used for local development and tests.
+    """
+
+    def __init__(self, directory):
+        self.directory = os.path.abspath(directory)
+        self.name = os.path.basename(self.directory)
+
+    def blob(self, name):
+        return LocalBlob(self, name)
+
+    def list_blobs(self, prefix=None):
+        """Return blobs under `prefix` in lexicographic order, like GCS"""
+        names = []
+        for root, _, files in os.walk(self.directory):
+            for filename in files:
+                relative = os.path.relpath(os.path.join(root, filename), self.directory)
+                name = relative.replace(os.sep, '/')
+                if prefix is None or name.startswith(prefix):
+                    names.append(name)
+        return [LocalBlob(self, name) for name in sorted(names)]
@@ -0,0 +1,102 @@
+import hashlib
+import json
+import os
+import uuid
+from datetime import datetime
+import joblib
+import pandas as pd
+
+
+class ModelRegistry:
+    """Directory of serialized per-item models keyed by a training-data fingerprint
+
+    Each item's model and scaler are stored in their own joblib file, named
+    after the item and fingerprint so that a retrained model never overwrites
+    one another worker still has indexed; index.json maps item names to the
+    file and the fingerprint of the data and feature set they were trained on.
+    A model is only reused when the fingerprint matches.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._index = self._read_index()
+
+    @property
+    def available(self):
+        return self.directory is not None
+
+    @staticmethod
+    def fingerprint(item, X, y, model_signature):
+        """Hash an item's training rows together with the feature/model signature"""
+        digest = hashlib.sha256()
+        digest.update(model_signature.encode('utf-8'))
+        digest.update(str(item).encode('utf-8'))
+        digest.update(pd.util.hash_pandas_object(X, index=False).values.tobytes())
+        digest.update(pd.util.hash_pandas_object(y, index=False).values.tobytes())
+        return digest.hexdigest()
+
+    def _index_path(self):
+        return os.path.join(self.directory, 'index.json')
+
+    def _read_index(self):
+        if not self.available:
+            return {}
+        try:
+            with open(self._index_path()) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_index(self):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{self._index_path()}.{uuid.uuid4().hex}"
+        with open(tmp_path, 'w') as f:
+            json.dump(self._index, f, indent=2)
+        os.replace(tmp_path, self._index_path())
+
+    def get_fingerprint(self, item):
+        entry = self._index.get(item)
+        return entry['fingerprint'] if entry else None
+
+    def get_metrics(self, item):
+        """Scores recorded when the item's model was trained"""
+        return dict(self._index.get(item, {}).get('metrics', {}))
+
+    def load(self, item):
+        """Return the stored (model, scaler) for an item"""
+        entry = self._index[item]
+        return joblib.load(os.path.join(self.directory, entry['file']))
+
+    def discard(self, item):
+        """Forget an item's saved model so that it is retrained"""
+        if self._index.pop(item, None) is not None:
+            self._write_index()
+
+    def save(self, item, model, scaler, fingerprint, metrics=None):
+        """Serialize an item's model and scaler and record its fingerprint"""
+        if not self.available:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+
+        prefix = hashlib.sha1(str(item).encode('utf-8')).hexdigest()[:16]
+        filename = f"{prefix}-{fingerprint[:16]}.joblib"
+        tmp_path = os.path.join(self.directory, f"{filename}.{uuid.uuid4().hex}")
+        joblib.dump((model, scaler), tmp_path)
+        os.replace(tmp_path, os.path.join(self.directory, filename))
+
+        # Keep the previous version for workers that have not retrained yet
+        previous = self._index.get(item, {}).get('file')
+        for entry in os.listdir(self.directory):
+            if entry.startswith(prefix) and entry.endswith('.joblib') and entry not in (filename, previous):
+                try:
+                    os.remove(os.path.join(self.directory, entry))
+                except OSError:
+                    pass
+
+        self._index[item] = {
+            'file': filename,
+            'fingerprint': fingerprint,
+            'trained_at': datetime.now().isoformat(),
+            'metrics': metrics or {},
+        }
+        self._write_index()
@@ -0,0 +1,158 @@
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+
+
+class _ByteCounter:
+    """File-like sink that only counts the bytes written to it"""
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += memoryview(data).nbytes
+
+
+def resident_size(obj):
+    """Approximate memory of an object: the size of its pickle (numpy arrays dominate)"""
+    counter = _ByteCounter()
+    pickle.dump(obj, counter, protocol=pickle.HIGHEST_PROTOCOL)
+    return counter.size
+
+
+class ModelStore(Mapping):
+    """Per-item (model, scaler) pairs, loaded from the registry on first use
+
+    Maps every item with a trained model to its (model, scaler), but only the
+    most recently used ones stay in memory: once their total size exceeds
+    `budget` bytes, the least recently used are evicted and reloaded from the
+    registry when requested again. Items whose saved model is missing or
+    outdated (e.g. no model directory) cannot be reloaded and stay resident.
+    Models are loaded outside the store's lock, once per item however many
+    requests ask for it at the same time.
+    """
+
+    def __init__(self, registry, budget=None):
+        if budget is None:
+            budget = int(float(os.getenv('MODEL_MEMORY_MB', 256)) * 1024 * 1024)
+        self.registry = registry
+        # Memory budget in bytes (0 keeps every loaded model)
+        self.budget = budget
+        self._versions = {}
+        # item -> (model, scaler, size), least recently used first
+        self._resident = OrderedDict()
+        # item -> Event set when its model has been loaded (or failed to)
+        self._loading = {}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'loads': 0, 'evictions': 0}
+
+    def __contains__(self, item):
+        return item in self._versions
+
+    def __iter__(self):
+        return iter(list(self._versions))
+
+    def __len__(self):
+        return len(self._versions)
+
+    def __getitem__(self, item):
+        with self._lock:
+            if item not in self._versions:
+                raise KeyError(item)
+
+            entry = self._resident.get(item)
+            if entry is not None:
+                self._resident.move_to_end(item)
+                self.stats['hits'] += 1
+                return entry[:2]
+
+            loading = self._loading.get(item)
+            if loading is None:
+                loading = self._loading[item] = threading.Event()
+                version = self._versions[item]
+            else:
+                version = None
+
+        if version is None:
+            # Another request is loading this model: wait for it and look again
+            loading.wait()
+            return self[item]
+
+        try:
+            model, scaler = self.registry.load(item)
+            size = resident_size((model, scaler))
+        except Exception as e:
+            print(f"Error loading saved model for {item}: {str(e)}")
+            with self._lock:
+                # Forget the item so the next training run refits it
+                if self._versions.get(item) == version:
+                    del self._versions[item]
+                    self.registry.discard(item)
+                del self._loading[item]
+            loading.set()
+            raise KeyError(item) from e
+
+        with self._lock:
+            self.stats['loads'] += 1
+            # Not kept if a new set of models was swapped in meanwhile
+            if self._versions.get(item) == version:
+                self._resident[item] = (model, scaler, size)
+                self._evict()
+            del self._loading[item]
+        loading.set()
+        return model, scaler
+
+    def _reloadable(self, item):
+        return self.registry.available and self.registry.get_fingerprint(item) == self._versions.get(item)
+
+    def _evict(self):
+        """Drop least recently used reloadable models until within the budget"""
+        if not self.budget:
+            return
+        total = sum(size for _, _, size in self._resident.values())
+        for item in list(self._resident):
+            if total <= self.budget:
+                break
+            if self._reloadable(item):
+                total -= self._resident.pop(item)[2]
+                self.stats['evictions'] += 1
+
+    def replace(self, versions, fitted):
+        """Swap in a new set of models
+
+        `versions` maps every item with a model to its version and `fitted`
+        holds the newly trained (model, scaler) pairs. Items keep their
+        resident model if its version is unchanged, and a newly trained one
+        stays resident only if the item's previous model was, or it cannot be
+        reloaded; the rest load lazily when requested.
+        """
+        with self._lock:
+            unchanged = {item for item, version in versions.items()
+                         if self._versions.get(item) == version and item not in fitted}
+            in_use = set(self._resident)
+            self._versions = dict(versions)
+            for item in list(self._resident):
+                if item not in unchanged:
+                    del self._resident[item]
+            for item, (model, scaler) in fitted.items():
+                if item in in_use or not self._reloadable(item):
+                    self._resident[item] = (model, scaler, resident_size((model, scaler)))
+            self._evict()
+
+    def resident_items(self):
+        """Items whose model is in memory, least recently used first"""
+        with self._lock:
+            return list(self._resident)
+
+    def report(self):
+        """Resident models, their total size against the budget, and load/eviction counters"""
+        with self._lock:
+            return {
+                'items': len(self._versions),
+                'resident': len(self._resident),
+                'resident_bytes': sum(size for _, _, size in self._resident.values()),
+                'budget_bytes': self.budget,
+                **self.stats,
+            }
@@ -0,0 +1,83 @@
+import time
+import uuid
+from datetime import datetime
+
+# Stages of a data refresh, in pipeline order (download and parse overlap)
+REFRESH_STAGES = ('download', 'parse', 'standardize', 'train', 'backtest')
+
+
+class Progress:
+    """Progress sink for long-running loads; the default ignores every update"""
+
+    def start(self, stage, total=None):
+        pass
+
+    def advance(self, stage, count=1):
+        pass
+
+    def finish(self, stage):
+        pass
+
+
+class RefreshJob(Progress):
+    """Status, per-stage timing and counts of one background data refresh"""
+
+    def __init__(self, full=False):
+        self.id = uuid.uuid4().hex
+        self.full = full
+        self.status = 'pending'
+        self.error = None
+        self.created_at = datetime.now()
+        self.finished_at = None
+        self.stages = {
+            stage: {'status': 'pending', 'count': 0, 'total': None, 'seconds': None}
+            for stage in REFRESH_STAGES
+        }
+        self._started = {}
+
+    @property
+    def done(self):
+        return self.status in ('succeeded', 'failed')
+
+    def start(self, stage, total=None):
+        self._started[stage] = time.perf_counter()
+        self.stages[stage].update(status='running', count=0, total=total)
+
+    def advance(self, stage, count=1):
+        self.stages[stage]['count'] += count
+
+    def finish(self, stage):
+        entry = self.stages[stage]
+        entry['status'] = 'done'
+        entry['seconds'] = round(time.perf_counter() - self._started[stage], 3)
+
+    def run(self):
+        self.status = 'running'
+
+    def succeed(self):
+        self._complete('succeeded')
+
+    def fail(self, error):
+        self.error = error
+        self._complete('failed')
+
+    def _complete(self, status):
+        self.status = status
+        self.finished_at = datetime.now()
+        # Stages with nothing to do (e.g. no new reports) never started
+        for entry in self.stages.values():
+            if entry['status'] == 'pending':
+                entry['status'] = 'skipped'
+            elif entry['status'] == 'running':
+                entry['status'] = status
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'full': self.full,
+            'error': self.error,
+            'created_at': self.created_at.isoformat(),
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'stages': {stage: dict(entry) for stage, entry in self.stages.items()},
+        }
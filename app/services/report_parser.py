@@ -0,0 +1,110 @@
+from io import StringIO
+import pandas as pd
+import numpy as np
+
+SECTION_MARKER = 'SALES BY MENU ITEM'
+HEADER_MARKER = 'Menu Item'
+
+
+def empty_menu_items():
+    """Return an empty menu items frame with the expected columns and dtypes"""
+    return pd.DataFrame({
+        'item_name': pd.Series(dtype='object'),
+        'quantity': pd.Series(dtype='int64'),
+        'sales': pd.Series(dtype='float64'),
+        'date': pd.Series(dtype='datetime64[ns]')
+    })
+
+
+def _cells_containing(df, text):
+    """Boolean row mask of rows where any text cell contains `text`"""
+    mask = np.zeros(len(df), dtype=bool)
+    for column in df.columns:
+        values = df[column]
+        # Numeric and datetime columns can never contain the section labels
+        if values.dtype != object:
+            continue
+        mask |= values.astype(str).str.contains(text, regex=False).to_numpy()
+    return mask
+
+
+def extract_menu_items(df):
+    """Extract the SALES BY MENU ITEM section of a report as item/quantity/sales rows
+
+    Vectorized replacement for the original row-by-row parser. The section
+    boundaries are found with column masks and the currency/number columns are
+    parsed in one pass, so the output is identical but built in a single step.
+    """
+    marker_rows = _cells_containing(df, SECTION_MARKER)
+
+    if not marker_rows.any():
+        # The marker may only appear in the CSV header line, in which case the
+        # section exists but has no rows
+        if any(SECTION_MARKER in str(column) for column in df.columns):
+            return empty_menu_items()
+        print("SALES BY MENU ITEM section not found")
+        return None
+
+    start = int(np.argmax(marker_rows))
+
+    # Rows after the section marker, skipping repeated markers and header rows
+    candidates = np.zeros(len(df), dtype=bool)
+    candidates[start + 1:] = True
+    candidates &= ~marker_rows
+    candidates &= ~_cells_containing(df, HEADER_MARKER)
+
+    # The section ends at the first completely empty row
+    blank_rows = np.flatnonzero(candidates & df.isna().all(axis=1).to_numpy())
+    if len(blank_rows):
+        candidates[blank_rows[0]:] = False
+
+    section = df.iloc[np.flatnonzero(candidates)]
+    if section.empty:
+        return empty_menu_items()
+
+    if section.shape[1] < 3:
+        print(f"Skipping {len(section)} rows due to error: not enough columns")
+        return empty_menu_items()
+
+    # Currency column: strip "$" and thousands separators, NaN cells stay NaN
+    sales_text = (section.iloc[:, 1].astype(str)
+                  .str.replace('$', '', regex=False)
+                  .str.replace(',', '', regex=False))
+    sales = pd.to_numeric(sales_text, errors='coerce')
+    valid_sales = sales.notna() | (sales_text.str.strip().str.lower() == 'nan')
+
+    # Quantity column: parsed as a float and truncated towards zero
+    quantity = pd.to_numeric(section.iloc[:, 2], errors='coerce')
+    valid_quantity = quantity.notna() & np.isfinite(quantity)
+
+    valid = (valid_sales & valid_quantity).to_numpy()
+    skipped = len(section) - int(valid.sum())
+    if skipped:
+        print(f"Skipping {skipped} rows that could not be parsed")
+
+    return pd.DataFrame({
+        'item_name': section.iloc[:, 0].to_numpy(dtype=object)[valid],
+        'quantity': np.trunc(quantity.to_numpy(dtype='float64')[valid]).astype('int64'),
+        'sales': sales.to_numpy(dtype='float64')[valid],
+        'date': pd.Series(df['date'].iloc[0], index=range(int(valid.sum())), dtype='datetime64[ns]')
+    })
+
+
+def parse_report(blob_name, content):
+    """Parse one downloaded report into menu item rows dated from its file name
+
+    Module level so it can run in a worker process. Errors reading the CSV are
+    raised to the caller; extraction errors are reported and yield None.
+    """
+    # Parse the date from the filename
+    date_str = blob_name.split('/')[-1].replace('.csv', '')
+
+    df = pd.read_csv(StringIO(content))
+    df['date'] = pd.to_datetime(date_str)
+
+    try:
+        return extract_menu_items(df)
+    except Exception as e:
+        print(f"Error extracting menu items: {str(e)}")
+        print(f"DataFrame head:\n{df.head()}")
+        return None
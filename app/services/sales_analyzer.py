@@ -1,95 +1,153 @@
 from google.cloud import storage
 import pandas as pd
 from datetime import datetime, timedelta
-from io import StringIO
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 import numpy as np
+import hashlib
 import json
+import multiprocessing
 import os
-import re
+import threading
+from app.services.report_parser import extract_menu_items, parse_report
+from app.services.history_store import HistoryStore
+from app.services.feature_store import feature_store
+from app.services.item_index import ItemIndex
+from app.services.item_names import ItemNameStandardizer
+from app.services.refresh_job import Progress
+
+# Parse processes start from a clean server process rather than a fork: they
+# are started while download (and request) threads run, and forking a process
+# with running threads can deadlock the child
+PARSE_CONTEXT = multiprocessing.get_context(
+    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+)
 
 class SalesAnalyzer:
-    def __init__(self, bucket_name="burgertone", credentials_path=None):
-        if credentials_path:
-            self.storage_client = storage.Client.from_service_account_json(credentials_path)
+    def __init__(self, bucket_name="burgertone", credentials_path=None, bucket=None,
+                 download_workers=None, parse_workers=None, incremental=True, cache_dir=None,
+                 item_names=None):
+        if bucket is not None:
+            # Use a pre-configured bucket (e.g. a LocalBucket for development and tests)
+            self.storage_client = None
+            self.bucket = bucket
         else:
-            # Try to get credentials from environment variable
-            credentials_json = os.getenv('GOOGLE_APPLICATION_CREDENTIALS')
-            if credentials_json:
-                self.storage_client = storage.Client.from_service_account_info(
-                    json.loads(credentials_json)
-                )
+            if credentials_path:
+                self.storage_client = storage.Client.from_service_account_json(credentials_path)
             else:
-                raise ValueError(
-                    "No credentials provided. Either pass credentials_path or "
-                    "set GOOGLE_APPLICATION_CREDENTIALS environment variable"
-                )
-        self.bucket = self.storage_client.bucket(bucket_name)
+                # Try to get credentials from environment variable
+                credentials_json = os.getenv('GOOGLE_APPLICATION_CREDENTIALS')
+                if credentials_json:
+                    self.storage_client = storage.Client.from_service_account_info(
+                        json.loads(credentials_json)
+                    )
+                else:
+                    raise ValueError(
+                        "No credentials provided. Either pass credentials_path or "
+                        "set GOOGLE_APPLICATION_CREDENTIALS environment variable"
+                    )
+            self.bucket = self.storage_client.bucket(bucket_name)
+        
+        # Concurrency for report ingestion: download threads overlap network I/O,
+        # parse processes spread CSV parsing across cores (0 parses in-process)
+        if download_workers is None:
+            download_workers = int(os.getenv('SALES_DOWNLOAD_WORKERS', 8))
+        if parse_workers is None:
+            parse_workers = int(os.getenv('SALES_PARSE_WORKERS', os.cpu_count() or 1))
+        self.download_workers = max(1, download_workers)
+        self.parse_workers = max(0, parse_workers)
         
         # Cache for historical data
         self._historical_data_cache = None
         self._last_cache_time = None
         self._cache_expiry = timedelta(hours=6)  # Refresh cache every 6 hours
+        self._item_index = None
+        # Memory of the last loaded history before and after _compact_history
+        self.memory_report = None
+        # Identifies the loaded data (derived from the source report fingerprints,
+        # so it is stable across restarts); None until data is loaded
+        self.data_version = None
+        
+        # Single-flight reloads: concurrent callers wait for the load in progress
+        # and share its result instead of starting their own
+        self._load_lock = threading.Lock()
+        self._load_generation = 0
+        # Progress sink of the load in progress (loads never overlap)
+        self._progress = Progress()
+        
+        # Incremental loading: only new or changed report blobs are fetched on reload.
+        # Fingerprints and parsed (pre-standardization) rows are kept per blob name.
+        self.incremental = incremental
+        self._blob_fingerprints = {}
+        self._raw_reports = {}
+        
+        # Persistent snapshot of the parsed history, shared across restarts and workers
+        if cache_dir is None:
+            cache_dir = os.getenv('SALES_CACHE_DIR')
+        self.history_store = HistoryStore(cache_dir)
+        
+        # Item name aliases (see item_names.py), loaded from ITEM_ALIASES_PATH by default
+        self.item_names = item_names if item_names is not None else ItemNameStandardizer.from_file()
         
     def _standardize_item_names(self, df):
         """Standardize item names to improve data consistency"""
         print("Standardizing item names...")
+        self._progress.start('standardize', total=len(df))
         
         # Create a copy to avoid modifying the original
         standardized_df = df.copy()
         
-        # Dictionary mapping various item names to their standardized version
-        item_mappings = {
-            # Classic variations
-            'classic': 'Classic',
-            'clssic combo': 'Classic',
-            'classic meal deal': 'Classic',
-            'classic combo': 'Classic',
-            'classic burger combo 1': 'Classic',
-            'classic burger': 'Classic',
-            'classic combo meal': 'Classic',
-            
-            # Add other mappings as needed
-        }
-        
-        # Function to standardize item names
-        def standardize_name(name):
-            if pd.isna(name):
-                return name
-                
-            # Convert to lowercase for case-insensitive matching
-            name_lower = str(name).lower().strip()
-            
-            # Check direct matches
-            if name_lower in item_mappings:
-                return item_mappings[name_lower]
-                
-            # Check partial matches using regex
-            for pattern, standard_name in item_mappings.items():
-                if re.search(r'\b' + re.escape(pattern) + r'\b', name_lower):
-                    return standard_name
-                    
-            # Return original name if no matches
-            return name
-            
-        # Apply standardization
+        # Apply standardization (each distinct name is resolved once, then mapped)
         standardized_df['original_item_name'] = standardized_df['item_name']
-        standardized_df['item_name'] = standardized_df['item_name'].apply(standardize_name)
+        standardized_df['item_name'] = self.item_names.standardize_series(standardized_df['item_name'])
         
-        # Aggregate data by standardized names
-        aggregated_df = standardized_df.groupby(['date', 'item_name']).agg({
-            'quantity': 'sum',
-            'sales': 'sum',
-            'original_item_name': lambda x: ', '.join(set(x))
-        }).reset_index()
+        # Aggregate data by standardized names (plain column sums, so the groupby
+        # stays on its cythonized path)
+        keys = ['date', 'item_name']
+        aggregated_df = standardized_df.groupby(keys)[['quantity', 'sales']].sum().reset_index()
+        aggregated_df['original_item_name'] = self._original_names(standardized_df, aggregated_df, keys)
         
         # Log standardization results
         print(f"Before standardization: {df['item_name'].nunique()} unique items")
         print(f"After standardization: {aggregated_df['item_name'].nunique()} unique items")
         
+        self._progress.advance('standardize', len(df))
+        self._progress.finish('standardize')
+        
         return aggregated_df
         
-    def load_historical_data(self, force_reload=False):
-        """Load all CSV files from GCS and combine them"""
+    @staticmethod
+    def _original_names(standardized_df, aggregated_df, keys):
+        """Raw names behind each aggregated row, comma-joined in sorted order
+        
+        Raw names are factorized once, so rows are deduplicated on integer codes
+        and almost every row takes its single name directly; only rows that
+        merged several raw names are joined.
+        """
+        codes, names = pd.factorize(standardized_df['original_item_name'], sort=True)
+        pairs = standardized_df[keys].assign(code=codes).drop_duplicates()
+        pairs = pairs[pairs['code'] >= 0]
+        merged = pairs.duplicated(keys, keep=False)
+        
+        single = pairs[~merged]
+        originals = pd.Series(names.take(single['code']), index=pd.MultiIndex.from_frame(single[keys]))
+        if merged.any():
+            several = pairs[merged].sort_values('code')
+            originals = pd.concat([
+                originals,
+                several.groupby(keys)['code'].agg(lambda group: ', '.join(names.take(group)))
+            ])
+        return originals.reindex(pd.MultiIndex.from_frame(aggregated_df[keys])).to_numpy()
+    
+    def load_historical_data(self, force_reload=False, incremental=None, progress=None):
+        """Load all CSV files from GCS and combine them
+        
+        In incremental mode (the default) a reload only downloads reports whose
+        blob fingerprint changed since the last load and merges them into the
+        cached data. Pass incremental=False to rebuild everything from scratch.
+        While a reload is running, other callers keep getting the previous data
+        (even if it has expired) until the new data is swapped in. `progress`
+        (see refresh_job.Progress) receives per-stage counts of a reload.
+        """
         current_time = datetime.now()
         
         # Check if we have valid cached data
@@ -98,33 +156,130 @@ class SalesAnalyzer:
             if current_time - self._last_cache_time < self._cache_expiry:
                 print("Using cached historical data")
                 return self._historical_data_cache
+            
+            # Stale while revalidating: don't queue behind a reload in progress
+            if self._load_lock.locked():
+                print("Using previous historical data while a reload runs")
+                return self._historical_data_cache
         
-        print("Loading historical data from GCS...")
-        dfs = []
+        generation = self._load_generation
+        with self._load_lock:
+            # Another request finished a load while this one was waiting (a
+            # forced reload, e.g. a full refresh, still runs its own)
+            if not force_reload and generation != self._load_generation:
+                print("Using historical data loaded by a concurrent request")
+                return self._historical_data_cache
+            
+            self._progress = progress or Progress()
+            try:
+                return self._load_locked(current_time, incremental)
+            finally:
+                self._progress = Progress()
+    
+    def _load_locked(self, current_time, incremental):
+        """Reload the history; runs with the load lock held"""
+        if incremental is None:
+            incremental = self.incremental
+        
+        # Start from the on-disk snapshot when nothing is loaded yet; the
+        # incremental pass below validates it against the bucket listing
+        if incremental and self._historical_data_cache is None:
+            self._restore_snapshot()
+        
+        blobs = list(self.bucket.list_blobs(prefix="reports/"))
         
-        for blob in self.bucket.list_blobs(prefix="reports/"):
+        if incremental and self._historical_data_cache is not None:
+            standardized_df = self._load_incremental(blobs)
+        else:
+            standardized_df = self._load_full(blobs)
+        
+        if standardized_df is not self._historical_data_cache:
+            standardized_df = self._compact_history(standardized_df, report=True)
             try:
-                print(f"Processing {blob.name}...")
-                content = blob.download_as_text()
-                
-                # Parse the date from the filename
-                date_str = blob.name.split('/')[-1].replace('.csv', '')
-                
-                # Read CSV content
-                df = pd.read_csv(StringIO(content))
-                
-                # Add date column
-                df['date'] = pd.to_datetime(date_str)
-                
-                # Extract sales data from SALES BY MENU ITEM section
-                menu_items = self._extract_menu_items(df)
-                if menu_items is not None:
-                    dfs.append(menu_items)
-                    
+                self.history_store.save(standardized_df, self._raw_reports, self._blob_fingerprints,
+                                        aliases=self.item_names.version)
             except Exception as e:
-                print(f"Error processing {blob.name}: {e}")
-                continue
+                # The snapshot only speeds up the next start; keep the loaded data
+                print(f"Error saving history snapshot: {e}")
         
+        # Update cache
+        self._historical_data_cache = standardized_df
+        self._last_cache_time = current_time
+        self._load_generation += 1
+        self.data_version = self._data_version()
+        
+        # Rebuild the per-item index once per data load, not per request
+        self.get_item_index()
+        
+        return standardized_df
+    
+    def _compact_history(self, df, report=False):
+        """Memory-optimized copy of a standardized history frame
+        
+        Item names become categoricals, so equality filters and groupbys compare
+        integer codes instead of strings, and quantities are stored as int32.
+        Sales stay float64: they are revenue figures served to the cent. Rows
+        are laid out item by item in date order, so each item's history is one
+        contiguous block (the item index then uses the frame as it is).
+        """
+        compact_df = df.astype({
+            'item_name': 'category',
+            'original_item_name': 'category',
+            'quantity': 'int32',
+        })
+        compact_df = compact_df.sort_values(['item_name', 'date'], kind='stable').reset_index(drop=True)
+        
+        if report:
+            before = int(df.memory_usage(deep=True).sum())
+            after = int(compact_df.memory_usage(deep=True).sum())
+            self.memory_report = {'rows': len(compact_df), 'bytes_before': before, 'bytes_after': after}
+            print(f"History frame: {before / 1e6:.2f} MB -> {after / 1e6:.2f} MB "
+                  f"({len(compact_df)} rows)")
+        return compact_df
+    
+    def _data_version(self):
+        """Hash of the alias table and the fingerprints of every report the cached data was built from"""
+        digest = hashlib.sha1(self.item_names.version.encode('utf-8'))
+        for name, fingerprint in sorted(self._blob_fingerprints.items()):
+            digest.update(repr((name, fingerprint)).encode('utf-8'))
+        return digest.hexdigest()[:16]
+    
+    def get_item_index(self):
+        """Per-item rows and summary statistics of the cached history
+        
+        The index is rebuilt only when the cached history has changed since it
+        was built. Returns None if no data has been loaded yet.
+        """
+        df = self._historical_data_cache
+        if df is None:
+            return None
+        if self._item_index is None or self._item_index.source is not df:
+            self._item_index = ItemIndex(df, self.get_summary_stats(df))
+        return self._item_index
+    
+    def get_daily_matrix(self):
+        """Dense item x day quantities and sales of the cached history (see DailyMatrix)
+        
+        Built once per data load and shared with the predictor's features.
+        Returns None if no data has been loaded yet.
+        """
+        df = self._historical_data_cache
+        if df is None:
+            return None
+        return feature_store.get(df).matrix
+    
+    def _load_full(self, blobs):
+        """Download, parse and standardize every report"""
+        print("Loading historical data from GCS...")
+        results, failed = self._ingest_blobs(blobs)
+        
+        self._blob_fingerprints = {}
+        self._raw_reports = {}
+        for blob, menu_items in zip(blobs, results):
+            if blob.name not in failed:
+                self._record_report(blob, menu_items)
+        
+        dfs = [menu_items for menu_items in results if menu_items is not None]
         if not dfs:
             raise ValueError("No valid data found in CSV files")
             
@@ -133,73 +288,143 @@ class SalesAnalyzer:
         print(f"Loaded data for {len(dfs)} days")
         
         # Standardize item names
-        standardized_df = self._standardize_item_names(combined_df)
+        return self._standardize_item_names(combined_df)
+    
+    def _load_incremental(self, blobs):
+        """Fetch only new or changed reports and merge them into the cached data"""
+        listed = {blob.name: blob for blob in blobs}
+        changed = [
+            blob for blob in blobs
+            if self._blob_fingerprints.get(blob.name) != self._blob_fingerprint(blob)
+        ]
+        removed = [name for name in self._blob_fingerprints if name not in listed]
         
-        # Update cache
-        self._historical_data_cache = standardized_df
-        self._last_cache_time = current_time
+        if not changed and not removed:
+            print("No new reports since last load")
+            return self._historical_data_cache
         
-        return standardized_df
+        print(f"Loading {len(changed)} new or changed reports from GCS "
+              f"({len(removed)} removed)...")
+        
+        # Dates whose aggregated rows must be rebuilt: those of replaced or removed
+        # reports plus those of the newly parsed ones
+        affected_dates = set()
+        for name in removed + [blob.name for blob in changed]:
+            previous = self._raw_reports.pop(name, None)
+            self._blob_fingerprints.pop(name, None)
+            if previous is not None:
+                affected_dates.update(previous['date'].unique())
+        
+        results, failed = self._ingest_blobs(changed)
+        for blob, menu_items in zip(changed, results):
+            if blob.name not in failed:
+                self._record_report(blob, menu_items)
+            if menu_items is not None:
+                affected_dates.update(menu_items['date'].unique())
+        
+        # Re-standardize the raw rows of the affected dates only
+        affected_raw = [
+            menu_items[menu_items['date'].isin(affected_dates)]
+            for menu_items in self._raw_reports.values()
+            if menu_items is not None
+        ]
+        affected_raw = [menu_items for menu_items in affected_raw if not menu_items.empty]
+        
+        cached_df = self._historical_data_cache
+        parts = [cached_df[~cached_df['date'].isin(affected_dates)]]
+        if affected_raw:
+            parts.append(self._standardize_item_names(pd.concat(affected_raw, ignore_index=True)))
+        
+        merged_df = pd.concat(parts, ignore_index=True)
+        if merged_df.empty:
+            raise ValueError("No valid data found in CSV files")
+        
+        # Sorted back into item/date order when compacted
+        return merged_df
     
-    def _extract_menu_items(self, df):
-        """Extract menu items sales data from CSV content"""
+    def _restore_snapshot(self):
+        """Seed the in-memory cache from the persistent snapshot, if there is one"""
         try:
-            # Convert content to string to search for sections
-            content = df.to_string()
-            
-            # Find the SALES BY MENU ITEM section
-            if 'SALES BY MENU ITEM' not in content:
-                print("SALES BY MENU ITEM section not found")
-                return None
-            
-            # Create DataFrame with correct columns and dtypes
-            menu_items = pd.DataFrame({
-                'item_name': pd.Series(dtype='str'),
-                'quantity': pd.Series(dtype='int'),
-                'sales': pd.Series(dtype='float'),
-                'date': pd.Series(dtype='datetime64[ns]')
-            })
-            
-            # Find rows between "SALES BY MENU ITEM" and the next section
-            menu_item_started = False
-            for index, row in df.iterrows():
-                # Check if we've reached the menu items section
-                if 'SALES BY MENU ITEM' in str(row.values):
-                    menu_item_started = True
-                    continue
-                
-                # Skip header row
-                if menu_item_started and 'Menu Item' in str(row.values):
-                    continue
+            snapshot = self.history_store.load(aliases=self.item_names.version)
+        except Exception as e:
+            print(f"Error loading history snapshot: {e}")
+            return
+        
+        if snapshot is not None:
+            history_df, self._raw_reports, self._blob_fingerprints = snapshot
+            # Saved compact, so used as loaded: numeric columns stay backed by
+            # the mapped file instead of a private copy per worker
+            self._historical_data_cache = history_df
+    
+    @staticmethod
+    def _blob_fingerprint(blob):
+        """Identify a blob's content by name-independent metadata"""
+        updated = blob.updated.isoformat() if blob.updated is not None else None
+        return (str(blob.generation), blob.md5_hash, updated)
+    
+    def _record_report(self, blob, menu_items):
+        """Remember an ingested blob so unchanged reports are skipped on reload"""
+        self._blob_fingerprints[blob.name] = self._blob_fingerprint(blob)
+        self._raw_reports[blob.name] = menu_items
+    
+    def _ingest_blobs(self, blobs):
+        """Download and parse report blobs concurrently
+        
+        Returns the parsed menu items in blob order and the names of blobs that
+        failed to download or parse, so they can be retried on the next load.
+        """
+        results = [None] * len(blobs)
+        failed = set()
+        parse_pool = ProcessPoolExecutor(max_workers=self.parse_workers, mp_context=PARSE_CONTEXT) if self.parse_workers else None
+        progress = self._progress
+        progress.start('download', total=len(blobs))
+        progress.start('parse', total=len(blobs))
+        
+        try:
+            with ThreadPoolExecutor(max_workers=self.download_workers) as download_pool:
+                downloads = {
+                    download_pool.submit(blob.download_as_text): index
+                    for index, blob in enumerate(blobs)
+                }
+                parses = {}
                 
-                # Stop if we hit the next section
-                if menu_item_started and row.isna().all():
-                    break
+                # Hand each report to the parser as soon as its download completes
+                for future in as_completed(downloads):
+                    index = downloads[future]
+                    blob = blobs[index]
+                    try:
+                        content = future.result()
+                        progress.advance('download')
+                        print(f"Processing {blob.name}...")
+                        if parse_pool is not None:
+                            parses[parse_pool.submit(parse_report, blob.name, content)] = index
+                        else:
+                            results[index] = parse_report(blob.name, content)
+                            progress.advance('parse')
+                    except Exception as e:
+                        print(f"Error processing {blob.name}: {e}")
+                        failed.add(blob.name)
+                progress.finish('download')
                 
-                # Process menu item row
-                if menu_item_started:
+                for future in as_completed(parses):
+                    index = parses[future]
                     try:
-                        # Use iloc instead of positional indexing
-                        item_name = row.iloc[0]
-                        sales = float(str(row.iloc[1]).replace('$', '').replace(',', ''))
-                        quantity = int(float(row.iloc[2]))
-                        
-                        # Create new row with correct dtypes
-                        new_row = pd.DataFrame({
-                            'item_name': [item_name],
-                            'quantity': [quantity],
-                            'sales': [sales],
-                            'date': [df['date'].iloc[0]]
-                        })
-                        
-                        # Append to existing DataFrame
-                        menu_items = pd.concat([menu_items, new_row], ignore_index=True)
-                        
-                    except (ValueError, IndexError) as e:
-                        print(f"Skipping row due to error: {e}")
-                        continue
-            
-            return menu_items
+                        results[index] = future.result()
+                        progress.advance('parse')
+                    except Exception as e:
+                        print(f"Error processing {blobs[index].name}: {e}")
+                        failed.add(blobs[index].name)
+        finally:
+            if parse_pool is not None:
+                parse_pool.shutdown()
+        progress.finish('parse')
+        
+        return results, failed
+    
+    def _extract_menu_items(self, df):
+        """Extract menu items sales data from CSV content"""
+        try:
+            return extract_menu_items(df)
             
         except Exception as e:
             print(f"Error extracting menu items: {str(e)}")
@@ -207,44 +432,40 @@ class SalesAnalyzer:
             return None
     
     def prepare_for_forecasting(self, df):
-        """Process data for ML model"""
-        print("Preparing data for forecasting...")
-        
-        # Add time-based features
-        df['day_of_week'] = df['date'].dt.dayofweek
-        df['month'] = df['date'].dt.month
-        df['is_weekend'] = df['day_of_week'].isin([5, 6]).astype(int)
+        """Copy of `df` with calendar, lag and moving-average columns added
         
-        # Calculate rolling statistics
-        df['prev_day_sales'] = df.groupby('item_name')['quantity'].shift(1)
-        df['prev_week_sales'] = df.groupby('item_name')['quantity'].shift(7)
-        df['moving_avg_7d'] = df.groupby('item_name')['quantity'].transform(
-            lambda x: x.rolling(window=7, min_periods=1).mean()
+        The values come from the feature store shared with the predictor, so
+        they are computed once per frame and `df` itself is not modified.
+        """
+        print("Preparing data for forecasting...")
+        features = feature_store.get(df).aligned()
+        prepared = df.assign(
+            day_of_week=features['day_of_week'],
+            month=features['month'],
+            is_weekend=features['is_weekend'],
+            prev_day_sales=features['qty_prev_day'],
+            prev_week_sales=features['qty_prev_week'],
+            moving_avg_7d=features['qty_7day_avg'],
         )
         
-        # Fill missing values
-        df = df.fillna({
-            'prev_day_sales': 0,
-            'prev_week_sales': 0,
-            'moving_avg_7d': 0
-        })
-        
         print("Data preparation completed")
-        return df
+        return prepared
 
     def get_summary_stats(self, df):
-        """Get summary statistics for each menu item"""
-        stats = df.groupby('item_name').agg({
-            'quantity': ['mean', 'std', 'min', 'max', 'sum'],
-            'sales': ['sum', 'mean']
-        }).round(2)
+        """Get summary statistics for each menu item
         
-        stats.columns = ['avg_daily_qty', 'std_qty', 'min_qty', 'max_qty', 
-                        'total_qty', 'total_sales', 'avg_daily_sales']
-        return stats
+        Computed over every reported day from the item's first sale to the
+        last date of the history, days without sales counting as 0 and days
+        without any report left out (see DailyMatrix.stats).
+        """
+        return feature_store.get(df).matrix.stats()
         
     def clear_cache(self):
         """Clear the data cache to force reload on next call"""
         self._historical_data_cache = None
         self._last_cache_time = None
+        self._item_index = None
+        self.data_version = None
+        self._blob_fingerprints = {}
+        self._raw_reports = {}
         print("Historical data cache cleared")
\ No newline at end of file
@@ -1,8 +1,18 @@
 import unittest
+import tempfile
+import threading
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from app.services import inventory_predictor
 from app.services.sales_analyzer import SalesAnalyzer
-from app.services.inventory_predictor import InventoryPredictor
+from app.services.inventory_predictor import InventoryPredictor, RollingWindow
+from app.services.feature_store import FEATURE_COLUMNS, FeatureStore
+from app.services.forecast_models import BACKENDS, WeekdayMean
+from app.services.backtest import Backtester
+from app.services.model_store import resident_size
 import os
 
 class TestInventoryPredictor(unittest.TestCase):
@@ -60,5 +70,423 @@ class TestInventoryPredictor(unittest.TestCase):
         except Exception as e:
             self.fail(f"Test failed with error: {e}")
 
+
+def synthetic_history(items=("Classic", "Fries", "Shake"), days=60, seed=0):
+    """Daily sales history with a weekly pattern for each item"""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2024-01-01", periods=days, freq="D")
+    frames = []
+    for base, item in enumerate(items, start=1):
+        quantity = base * 10 + 5 * (dates.dayofweek >= 5) + rng.integers(0, 5, size=days)
+        frames.append(pd.DataFrame({
+            'date': dates,
+            'item_name': item,
+            'quantity': quantity,
+            'sales': quantity * 9.5,
+            'original_item_name': item,
+        }))
+    return pd.concat(frames, ignore_index=True).sort_values(['date', 'item_name']).reset_index(drop=True)
+
+class TestInventoryPredictorModels(unittest.TestCase):
+    def setUp(self):
+        os.environ.setdefault("OPENAI_API_KEY", "test-key")
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.df = synthetic_history()
+    
+    def test_saved_models_are_reused(self):
+        """Test that unchanged items load their saved model instead of retraining"""
+        first = InventoryPredictor(model_dir=self.tmpdir.name)
+        first.train(self.df.copy())
+        self.assertEqual(sorted(first.models), ["Classic", "Fries", "Shake"])
+        
+        # Change one item's history: only that item is retrained
+        df = self.df.copy()
+        df.loc[df['item_name'] == 'Fries', 'quantity'] += 1
+        
+        second = InventoryPredictor(model_dir=self.tmpdir.name)
+        saved = []
+        save = second.registry.save
+        second.registry.save = lambda item, *args: saved.append(item) or save(item, *args)
+        second.train(df)
+        
+        self.assertEqual(saved, ["Fries"])
+        self.assertEqual(second.model_versions["Classic"], first.model_versions["Classic"])
+        self.assertNotEqual(second.model_versions["Fries"], first.model_versions["Fries"])
+        self.assertNotEqual(second.version, first.version)
+        self.assertEqual(first.predict(self.df.copy())["Classic"], second.predict(df)["Classic"])
+    
+    def test_model_files_per_version(self):
+        """Test that a retrained model does not overwrite the file another worker loads"""
+        first = InventoryPredictor(model_dir=self.tmpdir.name, n_jobs=1, backend='weekday_mean')
+        first.train(self.df.copy())
+        # A worker that loaded its models before another one retrained them
+        other = InventoryPredictor(model_dir=self.tmpdir.name, n_jobs=1, backend='weekday_mean')
+        other.train(self.df.copy())
+        
+        df = self.df.copy()
+        df.loc[df['item_name'] == 'Fries', 'quantity'] += 10
+        first.train(df)
+        self.assertNotEqual(first.registry._index["Fries"]['file'], other.registry._index["Fries"]['file'])
+        
+        # The other worker still lazily loads the model of the data it has
+        expected = InventoryPredictor(n_jobs=1, backend='weekday_mean')
+        expected.train(self.df.copy())
+        self.assertEqual(other.predict(self.df.copy())["Fries"], expected.predict(self.df.copy())["Fries"])
+    
+    def test_unwritable_model_dir(self):
+        """Test that models that cannot be saved are still trained and served"""
+        model_dir = os.path.join(self.tmpdir.name, "models")
+        open(model_dir, 'w').close()
+        predictor = InventoryPredictor(model_dir=model_dir, n_jobs=1, backend='weekday_mean', model_memory=1)
+        results = predictor.train(self.df.copy())
+        self.assertEqual({result['status'] for result in results.values()}, {'trained'})
+        self.assertEqual(len(predictor.models), 3)
+        self.assertEqual(predictor.get_model_stats()['resident'], 3)
+        self.assertEqual(sorted(predictor.predict(self.df, days_ahead=3)), ["Classic", "Fries", "Shake"])
+    
+    def test_training_results(self):
+        """Test the structured per-item training results"""
+        # An item first sold in the last 5 days has too little history
+        special = synthetic_history(items=("Special",), days=5)
+        special['date'] += pd.Timedelta(days=55)
+        df = pd.concat([self.df, special], ignore_index=True)
+        predictor = InventoryPredictor(n_jobs=2)
+        results = predictor.train(df)
+        
+        self.assertEqual(results["Special"], {'status': 'skipped', 'samples': 5})
+        self.assertEqual(results["Classic"]['status'], 'trained')
+        self.assertEqual(results["Classic"]['samples'], 60)
+        self.assertIn('train_score', results["Classic"])
+        self.assertIn('test_score', results["Classic"])
+        self.assertIs(predictor.training_results, results)
+    
+    def test_served_model_uses_recent_days(self):
+        """Test that the served models are fitted on the most recent days, not only the scored split"""
+        df = synthetic_history(items=("Classic",), days=100)
+        df['quantity'] = np.where(df.index < 80, 10, 50)
+        for backend in BACKENDS:
+            predictor = InventoryPredictor(n_jobs=1, backend=backend)
+            results = predictor.train(df.copy())
+            self.assertIn('test_score', results["Classic"])
+            forecast = [p['predicted_quantity'] for p in predictor.predict(df, days_ahead=7)["Classic"]]
+            # Fitted on the first 80 days only, every backend forecast 10
+            self.assertGreater(min(forecast), 10, backend)
+    
+    def test_predict_horizon(self):
+        """Test the shape of batched multi-day predictions"""
+        predictor = InventoryPredictor(n_jobs=1)
+        predictor.train(self.df.copy())
+        predictions = predictor.predict(self.df, days_ahead=10)
+        
+        self.assertEqual(sorted(predictions), ["Classic", "Fries", "Shake"])
+        classic = predictions["Classic"]
+        self.assertEqual([p['date'] for p in classic],
+                         pd.date_range("2024-03-01", periods=10).strftime('%Y-%m-%d').tolist())
+        self.assertTrue(all(isinstance(p['predicted_quantity'], int) for p in classic))
+        self.assertTrue(all(p['predicted_quantity'] >= 0 for p in classic))
+        
+        # A warm cache must not turn a negative horizon into a prefix of it
+        for days_ahead in (0, -1):
+            with self.assertRaises(ValueError):
+                predictor.predict(self.df, days_ahead=days_ahead)
+    
+    def test_recursive_strategy(self):
+        """Test that recursive forecasts start from the same features as static ones"""
+        predictor = InventoryPredictor(n_jobs=1, strategy='recursive')
+        predictor.train(self.df.copy())
+        
+        recursive = predictor.predict(self.df, days_ahead=14)
+        static = predictor.predict(self.df, days_ahead=14, strategy='static')
+        
+        self.assertEqual(len(recursive["Fries"]), 14)
+        for item in recursive:
+            self.assertEqual(recursive[item][0], static[item][0])
+        with self.assertRaises(ValueError):
+            predictor.predict(self.df, strategy='unknown')
+    
+    def test_prediction_cache(self):
+        """Test horizon extension and per-item invalidation of cached predictions"""
+        predictor = InventoryPredictor(n_jobs=1)
+        predictor.train(self.df.copy())
+        
+        for strategy in ('static', 'recursive'):
+            predictor.predict(self.df, days_ahead=7, strategy=strategy)
+            extended = predictor.predict(self.df, days_ahead=14, strategy=strategy)
+            fresh = predictor.predict(self.df, days_ahead=14, strategy=strategy, force_recalculate=True)
+            self.assertEqual(extended, fresh)
+        self.assertEqual(predictor.get_cache_stats(),
+                         {'hits': 0, 'extended': 6, 'misses': 12, 'entries': 6})
+        
+        # A shorter horizon is a slice of the cached one
+        shorter = predictor.predict(self.df, days_ahead=3, strategy='recursive')
+        self.assertEqual(shorter["Fries"], fresh["Fries"][:3])
+        self.assertEqual(predictor.cache_stats['hits'], 3)
+        
+        # Changing one item's recent history only recomputes that item
+        df = self.df.copy()
+        df.loc[df.index[-1], 'quantity'] += 50
+        changed = df.loc[df.index[-1], 'item_name']
+        predictor.predict(df, days_ahead=3)
+        self.assertEqual(predictor.cache_stats['hits'], 5)
+        self.assertEqual(predictor.cache_stats['misses'], 13)
+        self.assertIn((changed, 'static'), predictor._predictions_cache)
+    
+    def test_concurrent_predictions(self):
+        """Test that forecasts run outside the cache lock and concurrent requests agree"""
+        predictor = InventoryPredictor(n_jobs=1)
+        predictor.train(self.df.copy())
+        expected = InventoryPredictor(n_jobs=1)
+        expected.train(self.df.copy())
+        
+        locked = []
+        forecast = inventory_predictor.forecast_static
+        def checked_forecast(*args):
+            locked.append(predictor._cache_lock.locked())
+            return forecast(*args)
+        
+        with mock.patch.object(inventory_predictor, 'forecast_static', checked_forecast):
+            predictor.predict(self.df, days_ahead=3, force_recalculate=True)
+        self.assertEqual(locked, [False] * 3)
+        
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(lambda days: predictor.predict(self.df, days_ahead=days), [3, 7, 7, 14]))
+        self.assertEqual(results[1], results[2])
+        self.assertEqual(results[3], expected.predict(self.df, days_ahead=14))
+        self.assertEqual(results[0]["Fries"], results[3]["Fries"][:3])
+    
+    def test_predict_items(self):
+        """Test that predicting a subset of items only computes those items"""
+        predictor = InventoryPredictor(n_jobs=1)
+        predictor.train(self.df.copy())
+        
+        subset = predictor.predict(self.df, days_ahead=5, items=["Shake", "Unknown", "Fries"])
+        self.assertEqual(list(subset), ["Shake", "Fries"])
+        self.assertEqual(predictor.cache_stats['misses'], 2)
+        self.assertEqual(subset["Fries"], predictor.predict(self.df, days_ahead=5)["Fries"])
+    
+    def test_feature_store(self):
+        """Test store features against groupby rolling/shift, computed once and without modifying the frame"""
+        df = self.df.copy()
+        grouped = df.groupby('item_name')['quantity']
+        expected = pd.DataFrame({
+            'day_of_week': df['date'].dt.dayofweek,
+            'month': df['date'].dt.month,
+            'is_weekend': df['date'].dt.dayofweek.isin([5, 6]).astype(int),
+            'qty_7day_avg': grouped.transform(lambda x: x.rolling(window=7, min_periods=1).mean()),
+            'qty_30day_avg': grouped.transform(lambda x: x.rolling(window=30, min_periods=1).mean()),
+            'qty_prev_day': grouped.shift(1).fillna(0),
+            'qty_prev_week': grouped.shift(7).fillna(0),
+        })
+        
+        store = FeatureStore()
+        predictor = InventoryPredictor(n_jobs=1, features=store)
+        pd.testing.assert_frame_equal(predictor.prepare_features(df)[FEATURE_COLUMNS], expected)
+        self.assertEqual(df.columns.tolist(), self.df.columns.tolist())
+        
+        predictor.train(df)
+        predictor.predict(df, days_ahead=3)
+        self.assertEqual(len(store._sets), 1)
+        self.assertIs(store.get(df), store.get(df))
+    
+    def test_calendar_day_features(self):
+        """Test that lags and windows count calendar days when an item skips days"""
+        # Every day has a report, with at least one item sold
+        df = pd.DataFrame({
+            'date': pd.to_datetime(["2024-01-01", "2024-01-02", "2024-01-05", "2024-01-08", "2024-01-04",
+                                    "2024-01-03", "2024-01-06", "2024-01-07"]),
+            'item_name': ["Fries", "Fries", "Fries", "Fries", "Shake", "Soda", "Soda", "Soda"],
+            'quantity': [4, 2, 6, 8, 1, 1, 1, 1],
+            'sales': [16.0, 8.0, 24.0, 32.0, 5.0, 2.0, 2.0, 2.0],
+        })
+        features = FeatureStore().get(df)
+        matrix = features.matrix
+        
+        self.assertEqual(matrix.series("Fries").tolist(), [4, 2, 0, 0, 6, 0, 0, 8])
+        self.assertEqual(matrix.series("Shake").tolist(), [1, 0, 0, 0, 0])
+        
+        fries = features.item_frame("Fries")
+        self.assertEqual(fries['qty_prev_week'].tolist(), [0] * 7 + [4])
+        self.assertEqual(fries['qty_prev_day'].tolist()[:5], [0, 4, 2, 0, 0])
+        self.assertAlmostEqual(fries['qty_7day_avg'].iloc[-1], 16 / 7)
+        self.assertEqual(len(features.item_frame("Shake")), 5)
+        
+        aligned = features.aligned()
+        self.assertEqual(aligned['qty_prev_week'].tolist(), [0, 0, 0, 4, 0, 0, 0, 0])
+        self.assertEqual(aligned['qty_prev_day'].tolist(), [0, 4, 0, 0, 0, 0, 0, 1])
+        
+        stats = matrix.stats()
+        self.assertEqual(stats.loc["Fries", 'avg_daily_qty'], 2.5)
+        self.assertEqual(stats.loc["Shake", 'max_qty'], 1)
+        self.assertEqual(stats.loc["Shake", 'min_qty'], 0)
+    
+    def test_missing_report_days(self):
+        """Test that a day without any report is left out rather than read as no sales"""
+        df = synthetic_history(items=("Classic", "Fries"), days=20)
+        df['quantity'] = 10
+        df = df[df['date'] != "2024-01-15"].reset_index(drop=True)
+        features = FeatureStore().get(df)
+        matrix = features.matrix
+        
+        self.assertEqual(matrix.series("Classic").tolist(), [10] * 19)
+        self.assertEqual(len(features.item_frame("Classic")), 19)
+        stats = matrix.stats()
+        self.assertEqual(stats.loc["Classic", 'min_qty'], 10)
+        self.assertEqual(stats.loc["Classic", 'avg_daily_qty'], 10)
+        
+        # The day after the gap gets the last reported values
+        after = features.item_frame("Classic").set_index('date').loc["2024-01-16"]
+        self.assertEqual(after['qty_prev_day'], 10)
+        self.assertEqual(after['qty_7day_avg'], 10)
+        self.assertEqual(features.aligned()['qty_prev_day'].min(), 0)
+        self.assertEqual(features.aligned()['qty_prev_day'].iloc[2:].min(), 10)
+        
+        # Not scored in the backtest either
+        predictor = InventoryPredictor(n_jobs=1, backend='weekday_mean')
+        predictor.train(df)
+        report = Backtester(horizon=7, folds=2, step=3).run(predictor, df)
+        self.assertEqual(report['overall']['mae'], 0)
+        # Both folds' horizons include the missing day
+        self.assertEqual(report['overall']['samples'], 2 * 2 * 6)
+    
+    def test_model_backends(self):
+        """Test training and predicting with each backend, and that switching backends retrains"""
+        versions = {}
+        for backend in BACKENDS:
+            # The models share a directory: a saved model of another backend is never reused
+            predictor = InventoryPredictor(model_dir=self.tmpdir.name, n_jobs=1, backend=backend)
+            results = predictor.train(self.df.copy())
+            self.assertEqual(results["Classic"]['status'], 'trained', backend)
+            self.assertIsInstance(predictor.models["Classic"][0], type(BACKENDS[backend][1]()))
+            predictions = predictor.predict(self.df, days_ahead=7, strategy='recursive')
+            self.assertEqual(len(predictions["Shake"]), 7)
+            versions[backend] = predictor.model_versions["Fries"]
+        self.assertEqual(len(set(versions.values())), len(BACKENDS))
+        
+        with self.assertRaises(ValueError):
+            InventoryPredictor(backend='unknown')
+    
+    def test_weekday_mean(self):
+        """Test the weekday baseline against a groupby mean"""
+        X = self.df['date'].dt.dayofweek.to_numpy()[:, None]
+        y = self.df['quantity'].to_numpy()
+        model = WeekdayMean().fit(X, y)
+        expected = self.df.groupby(self.df['date'].dt.dayofweek)['quantity'].mean()
+        np.testing.assert_allclose(model.predict(np.arange(7)[:, None]), expected.to_numpy())
+        self.assertAlmostEqual(model.predict([[9]])[0], y.mean())
+    
+    def test_backtest(self):
+        """Test rolling-origin folds against weekday means of the days before each origin"""
+        predictor = InventoryPredictor(n_jobs=1, backend='weekday_mean')
+        predictor.train(self.df.copy())
+        backtester = Backtester(horizon=7, folds=3, step=7)
+        report = backtester.run(predictor, self.df)
+        
+        self.assertEqual(report['origins'], ["2024-02-09", "2024-02-16", "2024-02-23"])
+        errors = []
+        for origin in pd.to_datetime(report['origins']):
+            before = self.df[self.df['date'] < origin]
+            means = before.groupby([before['item_name'], before['date'].dt.dayofweek])['quantity'].mean()
+            after = self.df[(self.df['date'] >= origin) & (self.df['date'] < origin + pd.Timedelta(days=7))]
+            predicted = np.rint([means[(item, date.dayofweek)] for item, date in zip(after['item_name'], after['date'])])
+            errors.append(after.assign(error=predicted - after['quantity']))
+        errors = pd.concat(errors)
+        
+        fries = errors[errors['item_name'] == "Fries"]['error']
+        self.assertAlmostEqual(report['items']["Fries"]['mae'], fries.abs().mean(), places=3)
+        self.assertAlmostEqual(report['overall']['bias'], errors['error'].mean(), places=3)
+        self.assertEqual([entry['samples'] for entry in report['by_horizon']], [9] * 7)
+        
+        # Reused while the models are unchanged; a retrain only recomputes changed items
+        self.assertIs(backtester.run(predictor, self.df), report)
+        df = self.df.copy()
+        df.loc[df['item_name'] == 'Fries', 'quantity'] += 1
+        predictor.train(df)
+        self.assertEqual(backtester.run(predictor, df)['recomputed'], 1)
+    
+    def test_model_store(self):
+        """Test lazy loading of saved models and LRU eviction within the memory budget"""
+        InventoryPredictor(model_dir=self.tmpdir.name, n_jobs=1, backend='weekday_mean').train(self.df.copy())
+        expected = InventoryPredictor(n_jobs=1, backend='weekday_mean')
+        expected.train(self.df.copy())
+        size = resident_size(expected.models["Fries"])
+        
+        # A restarted predictor reuses the saved models without loading them
+        predictor = InventoryPredictor(model_dir=self.tmpdir.name, n_jobs=1, backend='weekday_mean',
+                                       model_memory=size * 5 // 2)
+        results = predictor.train(self.df.copy())
+        self.assertEqual({result['status'] for result in results.values()}, {'loaded'})
+        self.assertEqual(predictor.get_model_stats()['resident'], 0)
+        
+        # Room for two models: the least recently used one is evicted
+        self.assertEqual(predictor.predict(self.df, days_ahead=5), expected.predict(self.df, days_ahead=5))
+        self.assertEqual(list(predictor.models._resident), ["Fries", "Shake"])
+        predictor.models["Fries"]
+        predictor.models["Classic"]
+        self.assertEqual(list(predictor.models._resident), ["Fries", "Classic"])
+        stats = predictor.get_model_stats()
+        self.assertEqual((stats['loads'], stats['hits'], stats['evictions']), (4, 1, 2))
+        self.assertLessEqual(stats['resident_bytes'], stats['budget_bytes'])
+        
+        # Models that cannot be reloaded from disk are never evicted
+        expected.models.budget = 1
+        expected.models.replace(expected.model_versions, {})
+        self.assertEqual(expected.get_model_stats()['resident'], 3)
+        
+        # A saved model that fails to load is dropped and retrained
+        with open(os.path.join(self.tmpdir.name, predictor.registry._index["Shake"]['file']), 'wb') as f:
+            f.write(b"corrupt")
+        self.assertNotIn("Shake", predictor.predict(self.df, days_ahead=3, force_recalculate=True))
+        self.assertEqual(predictor.train(self.df.copy())["Shake"]['status'], 'trained')
+    
+    def test_model_store_in_use(self):
+        """Test that retraining keeps only models in use resident, and that loads don't block other lookups"""
+        InventoryPredictor(model_dir=self.tmpdir.name, n_jobs=1, backend='weekday_mean').train(self.df.copy())
+        predictor = InventoryPredictor(model_dir=self.tmpdir.name, n_jobs=1, backend='weekday_mean')
+        predictor.train(self.df.copy())
+        predictor.models["Fries"]
+        self.assertEqual(predictor.models.resident_items(), ["Fries"])
+        
+        # Every item is retrained, but only the one in use stays in memory
+        changed = self.df.copy()
+        changed['quantity'] += 1
+        results = predictor.train(changed)
+        self.assertEqual({result['status'] for result in results.values()}, {'trained'})
+        self.assertEqual(predictor.models.resident_items(), ["Fries"])
+        
+        # While a model loads, resident ones are served and other requests for it wait for that load
+        started, release = threading.Event(), threading.Event()
+        load = predictor.registry.load
+        def slow_load(item):
+            started.set()
+            release.wait(5)
+            return load(item)
+        
+        with mock.patch.object(predictor.registry, 'load', side_effect=slow_load), \
+                ThreadPoolExecutor(max_workers=2) as pool:
+            first = pool.submit(predictor.models.__getitem__, "Shake")
+            self.assertTrue(started.wait(5))
+            second = pool.submit(predictor.models.__getitem__, "Shake")
+            predictor.models["Fries"]
+            self.assertFalse(first.done())
+            release.set()
+            self.assertIs(first.result()[0], second.result()[0])
+        stats = predictor.get_model_stats()
+        self.assertEqual((stats['loads'], stats['hits']), (2, 2))
+    
+    def test_rolling_window(self):
+        """Test the ring buffer features against direct computation"""
+        values = list(np.arange(1, 41, dtype=float))
+        window = RollingWindow(values[:5])
+        for value in values[5:]:
+            window.push(value)
+        
+        avg_7, avg_30, prev_day, prev_week = window.features()
+        self.assertAlmostEqual(avg_7, np.mean(values[-7:]))
+        self.assertAlmostEqual(avg_30, np.mean(values[-30:]))
+        self.assertEqual(prev_day, values[-1])
+        self.assertEqual(prev_week, values[-7])
+        self.assertEqual(RollingWindow([3.0, 5.0]).features(), (4.0, 4.0, 5.0, 0))
+
 if __name__ == '__main__':
-    unittest.main() 
\ No newline at end of file
+    unittest.main()
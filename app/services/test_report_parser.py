@@ -0,0 +1,48 @@
+import unittest
+from io import StringIO
+import pandas as pd
+from app.services.report_parser import extract_menu_items
+
+REPORT = """Burgertone Sales Dashboard,,
+SALES SUMMARY,,
+Gross Sales,"$1,234.00",
+,,
+SALES BY MENU ITEM,,
+Menu Item,Gross Sales,Quantity
+Classic Burger,"$1,234.50",12
+Fries,$45.00,9.0
+Broken Row,comp,3
+Shake,,4
+Mystery,$5.00,
+"""
+
+class TestReportParser(unittest.TestCase):
+    def parse(self, content, date='2024-01-15'):
+        df = pd.read_csv(StringIO(content))
+        df['date'] = pd.to_datetime(date)
+        return extract_menu_items(df)
+
+    def test_extract_menu_items(self):
+        """Test parsing of the SALES BY MENU ITEM section"""
+        items = self.parse(REPORT)
+
+        self.assertEqual(items['item_name'].tolist(), ['Classic Burger', 'Fries', 'Shake'])
+        self.assertEqual(items['quantity'].tolist(), [12, 9, 4])
+        self.assertEqual(items['sales'].tolist()[:2], [1234.50, 45.00])
+        self.assertTrue(pd.isna(items['sales'].iloc[2]))
+        self.assertTrue((items['date'] == pd.Timestamp('2024-01-15')).all())
+        self.assertEqual(str(items['quantity'].dtype), 'int64')
+        self.assertEqual(str(items['date'].dtype), 'datetime64[ns]')
+
+    def test_missing_section(self):
+        """Test reports without a menu item section"""
+        self.assertIsNone(self.parse("Burgertone Sales Dashboard,,\nSALES SUMMARY,,\n"))
+
+    def test_empty_section(self):
+        """Test a menu item section without any rows"""
+        items = self.parse("Burgertone,,\nSALES BY MENU ITEM,,\nMenu Item,Gross Sales,Quantity\n")
+        self.assertTrue(items.empty)
+        self.assertEqual(list(items.columns), ['item_name', 'quantity', 'sales', 'date'])
+
+if __name__ == '__main__':
+    unittest.main()
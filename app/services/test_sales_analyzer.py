@@ -1,8 +1,15 @@
 import unittest
-from datetime import datetime
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
 import os
+import numpy as np
 import pandas as pd
 from app.services.sales_analyzer import SalesAnalyzer
+from app.services.item_names import ItemNameStandardizer
+from app.services.local_bucket import LocalBucket
+from app.services.refresh_job import RefreshJob
 
 class TestSalesAnalyzer(unittest.TestCase):
     def setUp(self):
@@ -52,4 +59,342 @@ class TestSalesAnalyzer(unittest.TestCase):
             print(f"Total records: {len(df)}")
             
         except Exception as e:
-            self.fail(f"Test failed with error: {e}") 
\ No newline at end of file
+            self.fail(f"Test failed with error: {e}")
+
+
+def write_report(directory, date_str, rows):
+    """Write a minimal TouchBistro report with the given (item, sales, quantity) rows"""
+    reports_dir = os.path.join(directory, "reports")
+    os.makedirs(reports_dir, exist_ok=True)
+    lines = ["Burgertone Sales Dashboard,,", "SALES BY MENU ITEM,,", "Menu Item,Gross Sales,Quantity"]
+    lines += [f'{item},"${sales:,.2f}",{quantity}' for item, sales, quantity in rows]
+    with open(os.path.join(reports_dir, f"{date_str}.csv"), "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+class TestSalesAnalyzerLocalBucket(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        
+        write_report(self.tmpdir.name, "2024-01-01", [("Classic Burger", 120.0, 10), ("Fries", 20.0, 5)])
+        write_report(self.tmpdir.name, "2024-01-02", [("Classic Combo", 60.0, 4), ("Fries", 8.0, 2)])
+        write_report(self.tmpdir.name, "2024-01-03", [("Fries", 12.0, 3)])
+    
+    def make_analyzer(self, **kwargs):
+        return SalesAnalyzer(bucket=LocalBucket(self.tmpdir.name), **kwargs)
+    
+    def test_parallel_load_matches_serial(self):
+        """Test that process-pool parsing gives the same data as in-process parsing"""
+        serial = self.make_analyzer(download_workers=1, parse_workers=0).load_historical_data()
+        parallel = self.make_analyzer(download_workers=4, parse_workers=2).load_historical_data()
+        
+        pd.testing.assert_frame_equal(serial, parallel)
+        self.assertEqual(len(serial), 5)
+        classic = serial[serial['item_name'] == 'Classic']
+        self.assertEqual(classic['quantity'].tolist(), [10, 4])
+    
+    def test_bad_report_is_isolated(self):
+        """Test that one unreadable report does not prevent loading the others"""
+        with open(os.path.join(self.tmpdir.name, "reports", "2024-01-04.csv"), "wb") as f:
+            f.write(b"\xff\xfe\x00garbage")
+        
+        df = self.make_analyzer(parse_workers=0).load_historical_data()
+        self.assertEqual(sorted(df['date'].dt.strftime('%Y-%m-%d').unique()),
+                         ["2024-01-01", "2024-01-02", "2024-01-03"])
+    
+    def test_incremental_reload(self):
+        """Test that a reload only fetches new or changed reports"""
+        analyzer = self.make_analyzer(parse_workers=0)
+        analyzer.load_historical_data()
+        
+        fetched = []
+        ingest_blobs = analyzer._ingest_blobs
+        def spy(blobs):
+            fetched.extend(blob.name for blob in blobs)
+            return ingest_blobs(blobs)
+        analyzer._ingest_blobs = spy
+        
+        write_report(self.tmpdir.name, "2024-01-02", [("Classic Meal Deal", 90.0, 6)])
+        write_report(self.tmpdir.name, "2024-01-04", [("Fries", 16.0, 4)])
+        os.remove(os.path.join(self.tmpdir.name, "reports", "2024-01-03.csv"))
+        
+        incremental = analyzer.load_historical_data(force_reload=True)
+        full = self.make_analyzer(parse_workers=0).load_historical_data()
+        
+        self.assertEqual(sorted(fetched), ["reports/2024-01-02.csv", "reports/2024-01-04.csv"])
+        pd.testing.assert_frame_equal(incremental, full)
+        
+        # Nothing changed: no downloads at all
+        fetched.clear()
+        analyzer.load_historical_data(force_reload=True)
+        self.assertEqual(fetched, [])
+    
+    def test_merged_item_names(self):
+        """Test that aliases of one item on the same day are summed with their raw names kept"""
+        write_report(self.tmpdir.name, "2024-01-02",
+                     [("Classic Combo", 60.0, 4), ("Classic Burger", 30.0, 2), ("Fries", 8.0, 2)])
+        df = self.make_analyzer(parse_workers=0).load_historical_data()
+        
+        classic = df[df['item_name'] == "Classic"]
+        classic = classic.set_index(classic['date'].dt.strftime('%Y-%m-%d'))
+        self.assertEqual(classic['quantity'].to_dict(), {"2024-01-01": 10, "2024-01-02": 6})
+        self.assertEqual(classic.loc["2024-01-02", 'sales'], 90.0)
+        self.assertEqual(classic['original_item_name'].to_dict(),
+                         {"2024-01-01": "Classic Burger", "2024-01-02": "Classic Burger, Classic Combo"})
+    
+    def test_compact_history(self):
+        """Test the compact dtypes and item-by-item layout of the loaded history"""
+        analyzer = self.make_analyzer(parse_workers=0)
+        df = analyzer.load_historical_data()
+        
+        self.assertIsInstance(df['item_name'].dtype, pd.CategoricalDtype)
+        self.assertIsInstance(df['original_item_name'].dtype, pd.CategoricalDtype)
+        self.assertEqual(df['quantity'].dtype, np.int32)
+        self.assertEqual(df['item_name'].tolist(), ["Classic"] * 2 + ["Fries"] * 3)
+        self.assertTrue(df.groupby('item_name', observed=True)['date'].is_monotonic_increasing.all())
+        self.assertIs(analyzer.get_item_index().frame, df)
+        self.assertLess(analyzer.memory_report['bytes_after'], analyzer.memory_report['bytes_before'])
+    
+    def test_item_index(self):
+        """Test that item index lookups match full-frame filters"""
+        analyzer = self.make_analyzer(parse_workers=0)
+        df = analyzer.load_historical_data()
+        index = analyzer.get_item_index()
+        
+        self.assertEqual(index.items, df['item_name'].unique().tolist())
+        for item in index.items:
+            expected = df[df['item_name'] == item]
+            pd.testing.assert_frame_equal(index.rows(item).reset_index(drop=True), expected.reset_index(drop=True))
+            pd.testing.assert_frame_equal(index.history(item, 2).reset_index(drop=True), expected.tail(2).reset_index(drop=True))
+            # Averaged over calendar days up to the last date, days without sales as 0
+            daily = expected.set_index('date')['quantity'].reindex(
+                pd.date_range(expected['date'].min(), df['date'].max()), fill_value=0)
+            self.assertAlmostEqual(index.mean_quantity(item), daily.mean(), places=2)
+        self.assertTrue(index.history("Unknown", 30).empty)
+        
+        # Reused until the history changes
+        self.assertIs(analyzer.get_item_index(), index)
+        write_report(self.tmpdir.name, "2024-01-04", [("Fries", 16.0, 4)])
+        analyzer.load_historical_data(force_reload=True)
+        self.assertEqual(analyzer.get_item_index().history("Fries", 1)['quantity'].tolist(), [4])
+    
+    def test_item_history_table(self):
+        """Test the shared-date-axis history table against per-item rows"""
+        analyzer = self.make_analyzer(parse_workers=0)
+        analyzer.load_historical_data()
+        index = analyzer.get_item_index()
+        
+        table = index.history_table('quantity', items=["Fries", "Classic", "Unknown"])
+        self.assertEqual(table.columns.tolist(), ["Fries", "Classic"])
+        self.assertEqual(table.index.strftime('%Y-%m-%d').tolist(), ["2024-01-01", "2024-01-02", "2024-01-03"])
+        self.assertEqual(table["Fries"].tolist(), index.rows("Fries")['quantity'].tolist())
+        self.assertEqual(table["Classic"].tolist()[:2], [10, 4])
+        self.assertTrue(np.isnan(table["Classic"].iloc[2]))
+        
+        ranged = index.history_table('sales', start="2024-01-02", end="2024-01-03")
+        self.assertEqual(ranged.index.strftime('%Y-%m-%d').tolist(), ["2024-01-02", "2024-01-03"])
+        self.assertEqual(len(index.history_table('sales', days=1)), 1)
+    
+    def test_item_history_range(self):
+        """Test date-range and most-recent-days selection of one item's history"""
+        analyzer = self.make_analyzer(parse_workers=0)
+        analyzer.load_historical_data()
+        index = analyzer.get_item_index()
+        
+        def dates(rows):
+            return rows['date'].dt.strftime('%Y-%m-%d').tolist()
+        
+        self.assertEqual(dates(index.history("Fries", start="2024-01-02")), ["2024-01-02", "2024-01-03"])
+        self.assertEqual(dates(index.history("Fries", end="2024-01-02")), ["2024-01-01", "2024-01-02"])
+        self.assertEqual(dates(index.history("Fries", days=1, end="2024-01-02")), ["2024-01-02"])
+        self.assertEqual(dates(index.history("Classic", start="2024-01-03")), [])
+        self.assertTrue(index.history("Fries", start="2024-01-03", end="2024-01-01").empty)
+    
+    def test_data_version(self):
+        """Test that the data version follows the source reports, not the process"""
+        analyzer = self.make_analyzer(parse_workers=0)
+        self.assertIsNone(analyzer.data_version)
+        analyzer.load_historical_data()
+        version = analyzer.data_version
+        
+        other = self.make_analyzer(parse_workers=0)
+        other.load_historical_data()
+        self.assertEqual(other.data_version, version)
+        
+        analyzer.load_historical_data(force_reload=True)
+        self.assertEqual(analyzer.data_version, version)
+        write_report(self.tmpdir.name, "2024-01-04", [("Fries", 16.0, 4)])
+        analyzer.load_historical_data(force_reload=True)
+        self.assertNotEqual(analyzer.data_version, version)
+    
+    def test_concurrent_reloads_share_one_load(self):
+        """Test that requests arriving during a reload wait for it instead of starting another"""
+        analyzer = self.make_analyzer(parse_workers=0)
+        loads = []
+        load_full = analyzer._load_full
+        def slow_load(blobs):
+            loads.append(len(blobs))
+            time.sleep(0.2)
+            return load_full(blobs)
+        analyzer._load_full = slow_load
+        
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(analyzer.load_historical_data()))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(loads, [3])
+        self.assertEqual(len(results), 4)
+        self.assertTrue(all(df is results[0] for df in results))
+    
+    def test_forced_reload_not_shared(self):
+        """Test that a forced full reload waiting behind an ordinary load still rebuilds"""
+        analyzer = self.make_analyzer(parse_workers=0)
+        loads = []
+        load_full = analyzer._load_full
+        def slow_load(blobs):
+            loads.append(len(blobs))
+            time.sleep(0.2)
+            return load_full(blobs)
+        analyzer._load_full = slow_load
+        
+        ordinary = threading.Thread(target=analyzer.load_historical_data)
+        ordinary.start()
+        while not loads:
+            time.sleep(0.01)
+        forced = analyzer.load_historical_data(force_reload=True, incremental=False)
+        ordinary.join()
+        
+        self.assertEqual(loads, [3, 3])
+        self.assertIs(forced, analyzer.load_historical_data())
+    
+    def test_expired_cache_served_during_reload(self):
+        """Test that expired data is still served while another reload holds the lock"""
+        analyzer = self.make_analyzer(parse_workers=0)
+        df = analyzer.load_historical_data()
+        analyzer._cache_expiry = timedelta(0)
+        
+        with analyzer._load_lock:
+            self.assertIs(analyzer.load_historical_data(), df)
+        
+        # Without a reload in progress the expired cache is reloaded
+        write_report(self.tmpdir.name, "2024-01-04", [("Fries", 16.0, 4)])
+        self.assertEqual(analyzer.load_historical_data()['date'].max(), pd.Timestamp("2024-01-04"))
+    
+    def test_reload_progress(self):
+        """Test per-stage counts reported to a refresh job"""
+        analyzer = self.make_analyzer(parse_workers=0)
+        job = RefreshJob()
+        analyzer.load_historical_data(progress=job)
+        job.succeed()
+        
+        stages = job.to_dict()['stages']
+        self.assertEqual(stages['download']['count'], 3)
+        self.assertEqual(stages['parse']['count'], 3)
+        self.assertEqual(stages['standardize']['count'], 5)
+        self.assertEqual(stages['train']['status'], 'skipped')
+        self.assertTrue(all(stages[stage]['status'] == 'done' for stage in ('download', 'parse', 'standardize')))
+        
+        # Nothing new to load: every stage is skipped
+        job = RefreshJob()
+        analyzer.load_historical_data(force_reload=True, progress=job)
+        job.succeed()
+        self.assertEqual({entry['status'] for entry in job.stages.values()}, {'skipped'})
+    
+    def test_snapshot_restores_history(self):
+        """Test that a new analyzer starts from the on-disk snapshot"""
+        cache_dir = os.path.join(self.tmpdir.name, "cache")
+        first = self.make_analyzer(parse_workers=0, cache_dir=cache_dir).load_historical_data()
+        
+        analyzer = self.make_analyzer(parse_workers=0, cache_dir=cache_dir)
+        fetched = []
+        ingest_blobs = analyzer._ingest_blobs
+        def spy(blobs):
+            fetched.extend(blob.name for blob in blobs)
+            return ingest_blobs(blobs)
+        analyzer._ingest_blobs = spy
+        
+        restored = analyzer.load_historical_data()
+        self.assertEqual(fetched, [])
+        pd.testing.assert_frame_equal(first, restored)
+        # Not copied on restore: still a read-only view of the mapped snapshot
+        self.assertFalse(restored['quantity'].to_numpy().flags.writeable)
+        
+        # A report added since the snapshot is picked up on the same load
+        write_report(self.tmpdir.name, "2024-01-05", [("Fries", 4.0, 1)])
+        analyzer = self.make_analyzer(parse_workers=0, cache_dir=cache_dir)
+        self.assertEqual(analyzer.load_historical_data()['date'].max(), pd.Timestamp("2024-01-05"))
+    
+    def test_snapshot_ignored_after_alias_change(self):
+        """Test that a snapshot standardized with other aliases is not reused"""
+        cache_dir = os.path.join(self.tmpdir.name, "cache")
+        first = self.make_analyzer(parse_workers=0, cache_dir=cache_dir)
+        first.load_historical_data()
+        
+        aliases = ItemNameStandardizer({"Classic": ["classic"], "Fries": ["fry"]})
+        analyzer = self.make_analyzer(parse_workers=0, cache_dir=cache_dir, item_names=aliases)
+        self.assertIsNone(analyzer.history_store.load(aliases=aliases.version))
+        analyzer.load_historical_data()
+        self.assertNotEqual(analyzer.data_version, first.data_version)
+
+    def test_snapshot_write_failure(self):
+        """Test that a snapshot that cannot be written does not fail the load"""
+        # A file where the cache directory should be, like an unwritable deploy
+        cache_dir = os.path.join(self.tmpdir.name, "cache")
+        open(cache_dir, 'w').close()
+        
+        df = self.make_analyzer(parse_workers=0, cache_dir=cache_dir).load_historical_data()
+        self.assertEqual(sorted(df['item_name'].unique()), ["Classic", "Fries"])
+    
+    def test_snapshot_pruning(self):
+        """Test that saving keeps the previous snapshot and others still being written"""
+        cache_dir = os.path.join(self.tmpdir.name, "cache")
+        analyzer = self.make_analyzer(parse_workers=0, cache_dir=cache_dir)
+        analyzer.load_historical_data()
+        store = analyzer.history_store
+        # Another worker's snapshot, not finished yet
+        os.makedirs(os.path.join(cache_dir, "snapshot-00000000000000000000-writing"))
+        
+        for day in ("2024-01-05", "2024-01-06"):
+            write_report(self.tmpdir.name, day, [("Fries", 4.0, 1)])
+            analyzer.load_historical_data(force_reload=True)
+        
+        with open(os.path.join(cache_dir, "CURRENT")) as f:
+            current = f.read().strip()
+        snapshots = sorted(entry for entry in os.listdir(cache_dir) if entry.startswith("snapshot-"))
+        self.assertEqual(len(snapshots), 3)
+        self.assertEqual(snapshots[0], "snapshot-00000000000000000000-writing")
+        self.assertEqual(snapshots[-1], current)
+        self.assertEqual(store.load(aliases=analyzer.item_names.version)[0]['date'].max(), pd.Timestamp("2024-01-06"))
+
+class TestItemNameStandardizer(unittest.TestCase):
+    def setUp(self):
+        self.names = ItemNameStandardizer({
+            "Classic": ["classic", "classic burger combo 1"],
+            "Fries": ["fries", "large fries"],
+        })
+    
+    def test_standardize(self):
+        """Test exact, whole-word and unmatched names"""
+        self.assertEqual(self.names.standardize(" Classic "), "Classic")
+        self.assertEqual(self.names.standardize("Double Classic Meal"), "Classic")
+        self.assertEqual(self.names.standardize("Neoclassical"), "Neoclassical")
+        self.assertEqual(self.names.standardize("Side of Large Fries"), "Fries")
+        self.assertTrue(pd.isna(self.names.standardize(np.nan)))
+    
+    def test_standardize_series(self):
+        """Test that a Series is mapped through each distinct name once"""
+        names = pd.Series(["Classic Combo", "Shake", None, "Classic Combo"])
+        self.assertEqual(self.names.standardize_series(names).tolist()[:2], ["Classic", "Shake"])
+        self.assertEqual(sorted(self.names._resolved), ["Classic Combo", "Shake"])
+    
+    def test_from_file(self):
+        """Test that the shipped alias table loads"""
+        names = ItemNameStandardizer.from_file()
+        self.assertEqual(names.standardize("classic meal deal"), "Classic")
+        self.assertEqual(len(names.version), 16)
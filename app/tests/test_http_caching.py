@@ -0,0 +1,166 @@
+import asyncio
+import os
+import tempfile
+from collections import OrderedDict
+import unittest
+from unittest import mock
+import pandas as pd
+from fastapi.testclient import TestClient
+from app.services.local_bucket import LocalBucket
+from app.services.test_sales_analyzer import write_report
+
+class TestConditionalRequests(unittest.TestCase):
+    """ETags, 304s and paging headers of the read endpoints, served from local reports"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        for i, day in enumerate(pd.date_range("2024-01-01", periods=30)):
+            write_report(cls.tmpdir.name, day.strftime('%Y-%m-%d'),
+                         [("Classic Burger", 120.0, 10 + i % 7), ("Fries", 20.0, 5 + i % 3), ("Shake", 30.0, 2)])
+
+        # The app reads its settings on import: serve the local reports, no background refresh
+        os.environ.setdefault("OPENAI_API_KEY", "test-key")
+        with mock.patch.dict(os.environ, {"REPORTS_DIR": cls.tmpdir.name, "REFRESH_INTERVAL_MINUTES": "0"}):
+            from app import main
+        cls.main = main
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def setUp(self):
+        # Fresh services per test, so each starts with nothing loaded
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        analyzer = self.main.SalesAnalyzer(bucket=LocalBucket(self.tmpdir.name), cache_dir=cache_dir.name,
+                                           parse_workers=0)
+        predictor = self.main.InventoryPredictor(model_dir=None, n_jobs=1, backend='ridge')
+        backtester = self.main.Backtester(horizon=3, folds=2)
+        for name, service in (("analyzer", analyzer), ("predictor", predictor), ("backtester", backtester)):
+            patcher = mock.patch.object(self.main, name, service)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # Requests only, without the startup/shutdown events
+        self.client = TestClient(self.main.app)
+
+    def test_no_etag_before_load(self):
+        """Test that a response built while loading the data carries no ETag"""
+        response = self.client.get("/api/inventory/items")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("etag", response.headers)
+
+        # Once loaded, the next response has one
+        self.assertIn("etag", self.client.get("/api/inventory/items").headers)
+
+    def test_not_modified(self):
+        """Test 304 on a matching If-None-Match, and a full response once the data changes"""
+        self.main.analyzer.load_historical_data()
+        first = self.client.get("/api/inventory/historical/Fries")
+        etag = first.headers["etag"]
+
+        response = self.client.get("/api/inventory/historical/Fries", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers["etag"], etag)
+        self.assertEqual(response.content, b"")
+
+        # Another URL has another ETag
+        other = self.client.get("/api/inventory/historical/Fries?days=7", headers={"If-None-Match": etag})
+        self.assertEqual(other.status_code, 200)
+
+        write_report(self.tmpdir.name, "2024-01-31", [("Fries", 20.0, 9)])
+        self.addCleanup(os.remove, os.path.join(self.tmpdir.name, "reports", "2024-01-31.csv"))
+        self.main.analyzer.load_historical_data(force_reload=True)
+        changed = self.client.get("/api/inventory/historical/Fries", headers={"If-None-Match": etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed.headers["etag"], etag)
+
+    def test_etag_per_representation(self):
+        """Test that JSON and NDJSON predictions have their own ETags and both vary on Accept"""
+        self.main.refresh_and_warm()
+        json_response = self.client.get("/api/inventory/predictions/7")
+        etag = json_response.headers["etag"]
+        self.assertIn("Accept", json_response.headers["vary"].split(", "))
+
+        ndjson = {"Accept": "application/x-ndjson"}
+        response = self.client.get("/api/inventory/predictions/7", headers={**ndjson, "If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["content-type"], "application/x-ndjson")
+        self.assertNotEqual(response.headers["etag"], etag)
+
+        not_modified = self.client.get("/api/inventory/predictions/7", headers={"If-None-Match": etag})
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertIn("Accept", not_modified.headers["vary"].split(", "))
+
+    def test_warm_up_loads_no_models(self):
+        """Test that the warm-up only precomputes predictions of items whose model is in memory"""
+        model_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(model_dir.cleanup)
+        self.main.InventoryPredictor(model_dir=model_dir.name, n_jobs=1, backend='ridge').train(
+            self.main.analyzer.load_historical_data())
+        predictor = self.main.InventoryPredictor(model_dir=model_dir.name, n_jobs=1, backend='ridge')
+        with mock.patch.object(self.main, "predictor", predictor):
+            # A restarted worker loads no saved models
+            self.main.refresh_and_warm()
+            self.assertEqual(predictor.get_model_stats()['loads'], 0)
+
+            # Requested models are kept warm by the next refresh
+            self.client.get("/api/inventory/predictions/3?limit=1")
+            self.main.refresh_and_warm()
+            self.assertEqual(predictor.models.resident_items(), ["Classic"])
+            self.assertEqual(predictor.get_model_stats()['loads'], 1)
+
+    def test_metrics(self):
+        """Test that metrics are pending until a backtest completes, then served with an ETag"""
+        df = self.main.refresh_and_warm()
+        pending = self.client.get("/api/inventory/metrics")
+        self.assertEqual(pending.status_code, 503)
+        self.assertEqual(pending.json(), {"status": "pending"})
+
+        self.main.run_backtest(df)
+        response = self.client.get("/api/inventory/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["model_version"], self.main.predictor.version)
+        self.assertEqual(sorted(response.json()["items"]), ["Classic", "Fries", "Shake"])
+        not_modified = self.client.get("/api/inventory/metrics", headers={"If-None-Match": response.headers["etag"]})
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_full_refresh_queued(self):
+        """Test that a full refresh requested during an incremental one runs after it"""
+        async def scenario():
+            incremental = self.main.start_refresh_job()
+            full = self.main.start_refresh_job(full=True)
+            self.assertIsNot(full, incremental)
+            self.assertTrue(full.full)
+            # Further requests are covered by the queued full refresh
+            self.assertIs(self.main.start_refresh_job(full=True), full)
+            self.assertIs(self.main.start_refresh_job(), full)
+
+            while not full.done:
+                await asyncio.sleep(0.1)
+            self.assertEqual((incremental.status, full.status), ("succeeded", "succeeded"))
+            self.assertLessEqual(incremental.finished_at, full.finished_at)
+            self.assertEqual(full.stages['parse']['count'], 30)
+
+        with mock.patch.object(self.main, "refresh_jobs", OrderedDict()):
+            asyncio.run(scenario())
+
+    def test_paging_headers(self):
+        """Test X-Total-Count and X-Next-Offset of paged predictions and history"""
+        self.main.refresh_and_warm()
+        first = self.client.get("/api/inventory/predictions/3?limit=2")
+        self.assertEqual([item["item_name"] for item in first.json()], ["Classic", "Fries"])
+        self.assertEqual(first.headers["x-total-count"], "3")
+        self.assertEqual(first.headers["x-next-offset"], "2")
+
+        last = self.client.get("/api/inventory/predictions/3?limit=2&offset=2")
+        self.assertEqual([item["item_name"] for item in last.json()], ["Shake"])
+        self.assertNotIn("x-next-offset", last.headers)
+
+        history = self.client.get("/api/inventory/historical/Fries?start=2024-01-01&end=2024-01-10&limit=4")
+        self.assertEqual(history.json()["dates"], ["2024-01-01", "2024-01-02", "2024-01-03", "2024-01-04"])
+        self.assertEqual(history.headers["x-total-count"], "10")
+        self.assertEqual(history.headers["x-next-offset"], "4")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import json
+import unittest
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.responses import dumps, finite_list, FastJSONResponse, NDJSONResponse, CompressionMiddleware
+
+class TestJSONEncoding(unittest.TestCase):
+    def test_dumps_non_finite_and_numpy(self):
+        """Test that NaN/inf become null and NumPy/datetime values are encoded"""
+        payload = {
+            'nan': float('nan'),
+            'inf': np.float64('inf'),
+            'int': np.int64(3),
+            'array': np.array([1.5, np.nan]),
+            'date': datetime(2024, 1, 2),
+            'timestamp': pd.Timestamp('2024-01-03'),
+        }
+        self.assertEqual(json.loads(dumps(payload)), {
+            'nan': None,
+            'inf': None,
+            'int': 3,
+            'array': [1.5, None],
+            'date': '2024-01-02T00:00:00',
+            'timestamp': '2024-01-03T00:00:00',
+        })
+
+    def test_finite_list(self):
+        self.assertEqual(finite_list(pd.Series([1.0, np.nan, np.inf])), [1.0, None, None])
+        self.assertEqual(finite_list(pd.Series([1, 2])), [1, 2])
+        self.assertEqual(finite_list(np.array([3.0, np.nan]), integer=True), [3, None])
+
+class TestCompression(unittest.TestCase):
+    def setUp(self):
+        app = FastAPI(default_response_class=FastJSONResponse)
+        app.add_middleware(CompressionMiddleware, minimum_size=100)
+
+        @app.get("/small")
+        def small():
+            return {"ok": True}
+
+        @app.get("/large")
+        def large():
+            return {"values": list(range(1000))}
+
+        @app.get("/stream")
+        def stream():
+            return NDJSONResponse({"item": i} for i in range(100))
+
+        self.client = TestClient(app)
+
+    def test_gzip(self):
+        """Test that large and streamed bodies are compressed and small ones are not"""
+        headers = {"Accept-Encoding": "gzip"}
+        self.assertNotIn("content-encoding", self.client.get("/small", headers=headers).headers)
+
+        response = self.client.get("/large", headers=headers)
+        self.assertEqual(response.headers["content-encoding"], "gzip")
+        self.assertEqual(response.json()["values"][-1], 999)
+
+        response = self.client.get("/stream", headers=headers)
+        self.assertEqual(response.headers["content-encoding"], "gzip")
+        self.assertEqual([json.loads(line)["item"] for line in response.text.splitlines()], list(range(100)))
+
+    def test_identity(self):
+        response = self.client.get("/large", headers={"Accept-Encoding": "identity"})
+        self.assertNotIn("content-encoding", response.headers)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,5 @@
+"""
+Performance benchmarks for the Burgertone backend services
+
+Run from the project root, e.g. `python -m benchmarks.bench_menu_items`
+"""
@@ -0,0 +1,82 @@
+"""
+Load test: latency of /api/inventory/items while /api/inventory/refresh-data
+reloads every report and retrains the models.
+
+With the blocking work on the worker pool, item requests keep being answered
+from the cached data during the refresh instead of queueing behind it.
+"""
+import asyncio
+import os
+import tempfile
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+
+import httpx
+import numpy as np
+
+from benchmarks.synthetic import synthetic_report_files
+
+
+async def sample_latency(client, stop, interval=0.01):
+    """Request the item list until `stop` is set, returning latencies in ms"""
+    latencies = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = await client.get("/api/inventory/items")
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+def summary(latencies):
+    return (f"{len(latencies):>6} {np.percentile(latencies, 50):>9.1f} "
+            f"{np.percentile(latencies, 95):>9.1f} {max(latencies):>9.1f}")
+
+
+async def run(app, startup_event):
+    await startup_event()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        # Idle baseline
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(sample_latency(client, stop))
+        await asyncio.sleep(2)
+        stop.set()
+        idle = await sampler
+
+        # Same requests while a refresh runs
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(sample_latency(client, stop))
+        start = time.perf_counter()
+        job = (await client.post("/api/inventory/refresh-data")).json()
+        while job['status'] not in ('succeeded', 'failed'):
+            await asyncio.sleep(0.1)
+            job = (await client.get(f"/api/inventory/refresh-data/{job['job_id']}")).json()
+        refresh_time = time.perf_counter() - start
+        stop.set()
+        busy = await sampler
+        assert job['status'] == 'succeeded', job['error']
+
+    return idle, busy, refresh_time
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        synthetic_report_files(tmpdir, n_days=365, n_items=40)
+        os.environ["REPORTS_DIR"] = tmpdir
+        os.environ["SALES_CACHE_DIR"] = os.path.join(tmpdir, "cache")
+        os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+        with redirect_stdout(StringIO()):
+            from app.main import app, startup_event
+            idle, busy, refresh_time = asyncio.run(run(app, startup_event))
+
+    print(f"{'':>16} {'reqs':>6} {'p50 (ms)':>9} {'p95 (ms)':>9} {'max (ms)':>9}")
+    print(f"{'idle':>16} {summary(idle)}")
+    print(f"{'during refresh':>16} {summary(busy)}   (refresh took {refresh_time:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Compare the per-item model backends on a holdout of the last 14 days: forecast
+error, training time, prediction latency and the size of the saved models.
+
+Each backend is trained on the history before the holdout and forecasts the
+holdout days with both strategies; MAE is over every item and day.
+"""
+import os
+import pickle
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+
+import numpy as np
+
+from app.services.forecast_models import BACKENDS
+from app.services.inventory_predictor import InventoryPredictor
+from benchmarks.synthetic import synthetic_history
+
+HOLDOUT_DAYS = 14
+
+
+def best_of(func, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def holdout_mae(predictions, actual):
+    errors = [
+        abs(p['predicted_quantity'] - actual.get((item, p['date']), 0))
+        for item, forecast in predictions.items()
+        for p in forecast
+    ]
+    return float(np.mean(errors))
+
+
+def main():
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    df = synthetic_history(n_items=32)
+    cutoff = df['date'].max() - np.timedelta64(HOLDOUT_DAYS, 'D')
+    train = df[df['date'] <= cutoff].reset_index(drop=True)
+    holdout = df[df['date'] > cutoff]
+    actual = dict(zip(zip(holdout['item_name'], holdout['date'].dt.strftime('%Y-%m-%d')),
+                      holdout['quantity']))
+
+    print(f"{'backend':>14} {'MAE static':>11} {'MAE recursive':>14} {'train (s)':>10} "
+          f"{'predict (ms)':>13} {'models (KiB)':>13}")
+    for backend in BACKENDS:
+        predictor = InventoryPredictor(model_dir=None, n_jobs=1, backend=backend)
+        with redirect_stdout(StringIO()):
+            start = time.perf_counter()
+            predictor.train(train)
+            training = time.perf_counter() - start
+
+            mae = {
+                strategy: holdout_mae(predictor.predict(train, days_ahead=HOLDOUT_DAYS, strategy=strategy), actual)
+                for strategy in ('static', 'recursive')
+            }
+            latency = best_of(lambda: predictor.predict(
+                train, days_ahead=HOLDOUT_DAYS, strategy='recursive', force_recalculate=True))
+
+        size = sum(len(pickle.dumps(predictor.models[item])) for item in predictor.models)
+        print(f"{backend:>14} {mae['static']:>11.2f} {mae['recursive']:>14.2f} {training:>10.2f} "
+              f"{latency * 1000:>13.1f} {size / 1024:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Benchmark the rolling-origin backtest that runs after each retrain: a full run
+for each backend, and the rerun after one item's history changed (only that
+item's folds are recomputed).
+"""
+import os
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+
+from app.services.backtest import Backtester
+from app.services.forecast_models import BACKENDS
+from app.services.inventory_predictor import InventoryPredictor
+from benchmarks.synthetic import synthetic_history
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    df = synthetic_history(n_items=32)
+    changed = df.copy()
+    changed.loc[changed['item_name'] == "Item 0", 'quantity'] += 1
+
+    print(f"{'backend':>14} {'folds':>6} {'full (s)':>9} {'one item changed (s)':>21} {'MAE':>6}   "
+          f"({os.cpu_count()} cores)")
+    for backend in BACKENDS:
+        predictor = InventoryPredictor(model_dir=None, backend=backend)
+        backtester = Backtester(horizon=7, folds=4)
+        with redirect_stdout(StringIO()):
+            predictor.train(df)
+            report, full = timed(lambda: backtester.run(predictor, df))
+            predictor.train(changed)
+            _, incremental = timed(lambda: backtester.run(predictor, changed))
+        print(f"{backend:>14} {backtester.folds:>6} {full:>9.2f} {incremental:>21.2f} "
+              f"{report['overall']['mae']:>6.2f}")
+
+
+if __name__ == "__main__":
+    main()
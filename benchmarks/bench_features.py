@@ -0,0 +1,79 @@
+"""
+Benchmark model feature preparation and summary statistics: the original
+row-based groupby versions against the DailyMatrix axis operations, on the
+original date-major layout and on the compact item-by-item history.
+
+The synthetic history has a row for every item and day, so row-based and
+calendar-day features agree and the outputs are compared.
+"""
+import time
+
+import pandas as pd
+
+from app.services.daily_matrix import DailyMatrix
+from app.services.feature_store import FEATURE_COLUMNS, FeatureSet
+from app.services.sales_analyzer import SalesAnalyzer
+from benchmarks.synthetic import synthetic_legacy_history
+
+
+def legacy_prepare_features(df):
+    """Original InventoryPredictor.prepare_features, kept for comparison"""
+    df['day_of_week'] = df['date'].dt.dayofweek
+    df['month'] = df['date'].dt.month
+    df['is_weekend'] = df['date'].dt.dayofweek.isin([5, 6]).astype(int)
+    df['qty_7day_avg'] = df.groupby('item_name', observed=True)['quantity'].transform(
+        lambda x: x.rolling(window=7, min_periods=1).mean()
+    )
+    df['qty_30day_avg'] = df.groupby('item_name', observed=True)['quantity'].transform(
+        lambda x: x.rolling(window=30, min_periods=1).mean()
+    )
+    df['qty_prev_day'] = df.groupby('item_name', observed=True)['quantity'].shift(1)
+    df['qty_prev_week'] = df.groupby('item_name', observed=True)['quantity'].shift(7)
+    return df.fillna({'qty_prev_day': 0, 'qty_prev_week': 0, 'qty_7day_avg': 0, 'qty_30day_avg': 0})
+
+
+def legacy_summary_stats(df):
+    """Original SalesAnalyzer.get_summary_stats, kept for comparison"""
+    stats = df.groupby('item_name', observed=True).agg({
+        'quantity': ['mean', 'std', 'min', 'max', 'sum'],
+        'sales': ['sum', 'mean']
+    }).round(2)
+    stats.columns = ['avg_daily_qty', 'std_qty', 'min_qty', 'max_qty',
+                     'total_qty', 'total_sales', 'avg_daily_sales']
+    return stats
+
+
+def best_of(func, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    history = synthetic_legacy_history()
+    compact = SalesAnalyzer.__new__(SalesAnalyzer)._compact_history(history)
+    print(f"{'':>20} {'rows':>8} {'legacy (ms)':>12} {'matrix (ms)':>12} {'speedup':>8}")
+    for name, df in (("date-major", history), ("compact", compact)):
+        expected = legacy_prepare_features(df.copy())[FEATURE_COLUMNS]
+        pd.testing.assert_frame_equal(expected, FeatureSet(df).aligned(), check_dtype=False)
+        legacy = best_of(lambda: legacy_prepare_features(df.copy()))
+        # Matrix build plus every training feature
+        store = best_of(lambda: FeatureSet(df).frame)
+        print(f"{'features ' + name:>20} {len(df):>8} {legacy * 1000:>12.1f} {store * 1000:>12.1f} "
+              f"{legacy / store:>7.1f}x")
+
+        matrix = DailyMatrix(df)
+        expected = legacy_summary_stats(df)
+        pd.testing.assert_frame_equal(expected.set_axis(expected.index.astype(str)).sort_index(),
+                                      matrix.stats().sort_index(), check_dtype=False, check_names=False)
+        legacy = best_of(lambda: legacy_summary_stats(df))
+        new = best_of(lambda: matrix.stats())
+        print(f"{'stats ' + name:>20} {len(df):>8} {legacy * 1000:>12.1f} {new * 1000:>12.1f} "
+              f"{legacy / new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
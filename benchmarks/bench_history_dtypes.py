@@ -0,0 +1,44 @@
+"""
+Benchmark the compact history layout (categorical item names, int32
+quantities, item-by-item rows) against the object-string frame it replaces:
+memory, per-item equality filters and groupbys.
+"""
+import time
+
+from app.services.sales_analyzer import SalesAnalyzer
+from benchmarks.synthetic import synthetic_legacy_history
+
+
+def best_of(func, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    legacy = synthetic_legacy_history()
+    analyzer = SalesAnalyzer.__new__(SalesAnalyzer)
+    compact = analyzer._compact_history(legacy, report=True)
+    report = analyzer.memory_report
+    print(f"rows: {report['rows']}, memory: {report['bytes_before'] / 1e6:.1f} MB -> "
+          f"{report['bytes_after'] / 1e6:.1f} MB")
+
+    item = "Menu Item 150"
+    cases = (
+        ("filter item == name", lambda df: df[df['item_name'] == item]),
+        ("groupby item sum", lambda df: df.groupby('item_name', observed=True)[['quantity', 'sales']].sum()),
+        ("groupby item stats", lambda df: analyzer.get_summary_stats(df)),
+        ("groupby date,item sum", lambda df: df.groupby(['date', 'item_name'], observed=True)['quantity'].sum()),
+    )
+    print(f"{'operation':>24} {'object (ms)':>12} {'compact (ms)':>13} {'speedup':>8}")
+    for name, func in cases:
+        before = best_of(lambda: func(legacy))
+        after = best_of(lambda: func(compact))
+        print(f"{name:>24} {before * 1000:>12.1f} {after * 1000:>13.1f} {before / after:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark response serialization: the original json.dumps + NaNJSONEncoder
+path against app.responses.dumps for full-menu payloads.
+"""
+import gzip
+import json
+import math
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from app.responses import dumps, finite_list, orjson
+
+
+class NaNJSONEncoder(json.JSONEncoder):
+    """Original encoder from app/main.py, kept for comparison"""
+    def default(self, obj):
+        if isinstance(obj, float) and (math.isnan(obj) or math.isinf(obj)):
+            return None
+        if isinstance(obj, np.float64) or isinstance(obj, np.float32):
+            if np.isnan(obj) or np.isinf(obj):
+                return None
+            return float(obj)
+        if isinstance(obj, np.int64) or isinstance(obj, np.int32):
+            return int(obj)
+        if isinstance(obj, datetime):
+            return obj.isoformat()
+        return super().default(obj)
+
+
+def legacy_dumps(content):
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, cls=NaNJSONEncoder).encode("utf-8")
+
+
+def predictions_payload(n_items, days):
+    dates = pd.date_range("2024-03-01", periods=days).strftime('%Y-%m-%d').tolist()
+    return [
+        {
+            "item_name": f"Item {i}",
+            "predictions": [{"date": date, "predicted_quantity": (i + d) % 40} for d, date in enumerate(dates)],
+            "historical_avg": round(10 + i / 7, 2),
+        }
+        for i in range(n_items)
+    ]
+
+
+def history_payload(n_items, days):
+    rng = np.random.default_rng(0)
+    dates = pd.date_range("2023-01-01", periods=days).strftime('%Y-%m-%d').tolist()
+    return [
+        {
+            "item_name": f"Item {i}",
+            "dates": dates,
+            "quantities": rng.integers(0, 50, size=days).tolist(),
+            "sales": finite_list(rng.random(days) * 400),
+        }
+        for i in range(n_items)
+    ]
+
+
+def best_of(func, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    print(f"encoder: {'orjson' if orjson is not None else 'stdlib'}")
+    print(f"{'payload':>22} {'legacy (ms)':>12} {'fast (ms)':>10} {'speedup':>8} {'size':>9} {'gzip':>8}")
+    for name, payload in (
+        ("predictions 200x30", predictions_payload(200, 30)),
+        ("history 200x365", history_payload(200, 365)),
+    ):
+        assert json.loads(legacy_dumps(payload)) == json.loads(dumps(payload))
+        legacy = best_of(lambda: legacy_dumps(payload))
+        fast = best_of(lambda: dumps(payload))
+        body = dumps(payload)
+        compressed = gzip.compress(body, compresslevel=6)
+        print(f"{name:>22} {legacy * 1000:>12.1f} {fast * 1000:>10.1f} {legacy / fast:>7.1f}x "
+              f"{len(body) // 1024:>7}kB {len(compressed) // 1024:>6}kB")
+
+
+if __name__ == "__main__":
+    main()
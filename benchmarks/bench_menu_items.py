@@ -0,0 +1,85 @@
+"""
+Benchmark the vectorized SALES BY MENU ITEM parser against the original
+row-by-row implementation on synthetic multi-thousand-row reports.
+"""
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+
+import pandas as pd
+
+from app.services.report_parser import extract_menu_items
+from benchmarks.synthetic import synthetic_report
+
+
+def legacy_extract_menu_items(df):
+    """Original iterrows/concat implementation, kept for comparison"""
+    content = df.to_string()
+    if 'SALES BY MENU ITEM' not in content:
+        return None
+
+    menu_items = pd.DataFrame({
+        'item_name': pd.Series(dtype='str'),
+        'quantity': pd.Series(dtype='int'),
+        'sales': pd.Series(dtype='float'),
+        'date': pd.Series(dtype='datetime64[ns]')
+    })
+
+    menu_item_started = False
+    for index, row in df.iterrows():
+        if 'SALES BY MENU ITEM' in str(row.values):
+            menu_item_started = True
+            continue
+        if menu_item_started and 'Menu Item' in str(row.values):
+            continue
+        if menu_item_started and row.isna().all():
+            break
+        if menu_item_started:
+            try:
+                item_name = row.iloc[0]
+                sales = float(str(row.iloc[1]).replace('$', '').replace(',', ''))
+                quantity = int(float(row.iloc[2]))
+                new_row = pd.DataFrame({
+                    'item_name': [item_name],
+                    'quantity': [quantity],
+                    'sales': [sales],
+                    'date': [df['date'].iloc[0]]
+                })
+                menu_items = pd.concat([menu_items, new_row], ignore_index=True)
+            except (ValueError, IndexError):
+                continue
+
+    return menu_items
+
+
+def load_report(n_items):
+    df = pd.read_csv(StringIO(synthetic_report(n_items=n_items)))
+    df['date'] = pd.to_datetime('2024-01-01')
+    return df
+
+
+def time_call(func, df, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        with redirect_stdout(StringIO()):
+            start = time.perf_counter()
+            func(df)
+            elapsed = time.perf_counter() - start
+        best = min(best, elapsed)
+    return best
+
+
+def main():
+    print(f"{'rows':>8} {'legacy (s)':>12} {'vectorized (s)':>15} {'speedup':>9}")
+    for n_items in (100, 1000, 5000):
+        df = load_report(n_items)
+        with redirect_stdout(StringIO()):
+            pd.testing.assert_frame_equal(legacy_extract_menu_items(df), extract_menu_items(df))
+
+        legacy = time_call(legacy_extract_menu_items, df, repeat=1)
+        vectorized = time_call(extract_menu_items, df, repeat=5)
+        print(f"{n_items:>8} {legacy:>12.4f} {vectorized:>15.4f} {legacy / vectorized:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Benchmark resident model memory and prediction latency under a model memory
+budget. Models are trained and saved once; a restarted predictor then serves
+predictions for the whole menu with the budget unlimited and with room for a
+quarter of the models (the rest are loaded from disk when requested).
+"""
+import os
+import tempfile
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+
+from app.services.inventory_predictor import InventoryPredictor
+from benchmarks.synthetic import synthetic_history
+
+
+def main():
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    df = synthetic_history(n_items=32)
+    with tempfile.TemporaryDirectory() as model_dir, redirect_stdout(StringIO()):
+        trained = InventoryPredictor(model_dir=model_dir)
+        trained.train(df)
+        total = trained.get_model_stats()['resident_bytes']
+
+        rows = []
+        for name, budget in (("unlimited", 0), ("1/4 of models", total // 4)):
+            predictor = InventoryPredictor(model_dir=model_dir, model_memory=budget)
+            predictor.train(df)
+            after_start = predictor.get_model_stats()['resident_bytes']
+
+            start = time.perf_counter()
+            predictor.predict(df, days_ahead=7)
+            first = time.perf_counter() - start
+            start = time.perf_counter()
+            predictor.predict(df, days_ahead=7, force_recalculate=True)
+            second = time.perf_counter() - start
+
+            stats = predictor.get_model_stats()
+            rows.append((name, after_start, stats['resident_bytes'], stats['loads'], first, second))
+
+    print(f"{'budget':>14} {'startup (MiB)':>14} {'resident (MiB)':>15} {'loads':>6} "
+          f"{'1st predict (s)':>16} {'2nd predict (s)':>16}   (all models: {total / 2 ** 20:.1f} MiB)")
+    for name, after_start, resident, loads, first, second in rows:
+        print(f"{name:>14} {after_start / 2 ** 20:>14.1f} {resident / 2 ** 20:>15.1f} {loads:>6} "
+              f"{first:>16.2f} {second:>16.2f}")
+
+
+if __name__ == "__main__":
+    main()
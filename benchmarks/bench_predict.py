@@ -0,0 +1,86 @@
+"""
+Benchmark batched multi-horizon prediction (and the recursive strategy)
+against the original loop that built one DataFrame and made one predict
+call per (item, day).
+"""
+import os
+import time
+import warnings
+from contextlib import redirect_stdout
+from datetime import timedelta
+from io import StringIO
+
+import pandas as pd
+
+from app.services.inventory_predictor import InventoryPredictor
+from benchmarks.synthetic import synthetic_history
+
+
+def legacy_predict(predictor, df, days_ahead):
+    """Original per-day prediction loop, kept for comparison"""
+    predictions = {}
+    last_date = df['date'].max()
+    df = predictor.prepare_features(df.copy())
+
+    for item in predictor.models.keys():
+        model, scaler = predictor.models[item]
+        item_predictions = []
+        current_df = df[df['item_name'] == item].copy()
+        for i in range(days_ahead):
+            next_date = last_date + timedelta(days=i+1)
+            pred_features = pd.DataFrame({
+                'day_of_week': [next_date.dayofweek],
+                'month': [next_date.month],
+                'is_weekend': [1 if next_date.dayofweek in [5, 6] else 0],
+                'qty_7day_avg': [current_df['quantity'].tail(7).mean()],
+                'qty_30day_avg': [current_df['quantity'].tail(30).mean()],
+                'qty_prev_day': [current_df['quantity'].iloc[-1]],
+                'qty_prev_week': [current_df['quantity'].iloc[-7] if len(current_df) > 7 else 0]
+            })
+            pred_features_scaled = scaler.transform(pred_features.to_numpy(dtype=float))
+            pred_qty = model.predict(pred_features_scaled)[0]
+            item_predictions.append({
+                'date': next_date.strftime('%Y-%m-%d'),
+                'predicted_quantity': max(0, round(pred_qty))
+            })
+        predictions[item] = item_predictions
+    return predictions
+
+
+def best_of(func, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        with redirect_stdout(StringIO()):
+            start = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    warnings.simplefilter("ignore")
+
+    df = synthetic_history(n_items=20, n_days=365)
+    predictor = InventoryPredictor(model_dir=None, n_jobs=1)
+    with redirect_stdout(StringIO()):
+        predictor.train(df.copy())
+
+    print(f"{'days':>5} {'legacy (s)':>11} {'batched (s)':>12} {'speedup':>8} {'recursive (s)':>14} {'speedup':>8}"
+          f"   ({len(predictor.models)} items)")
+    for days in (7, 14, 30):
+        with redirect_stdout(StringIO()):
+            expected = legacy_predict(predictor, df, days)
+            actual = predictor.predict(df, days_ahead=days, force_recalculate=True)
+        assert expected == actual, "batched predictions differ from the legacy loop"
+
+        legacy = best_of(lambda: legacy_predict(predictor, df, days), repeat=1)
+        batched = best_of(lambda: predictor.predict(df, days_ahead=days, force_recalculate=True))
+        recursive = best_of(lambda: predictor.predict(df, days_ahead=days, force_recalculate=True,
+                                                      strategy='recursive'))
+        print(f"{days:>5} {legacy:>11.3f} {batched:>12.3f} {legacy / batched:>7.1f}x"
+              f" {recursive:>14.3f} {legacy / recursive:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""
+Benchmark per-item model training with one worker against all cores.
+"""
+import os
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+
+from app.services.inventory_predictor import InventoryPredictor
+from benchmarks.synthetic import synthetic_history
+
+
+def time_training(df, n_jobs):
+    predictor = InventoryPredictor(model_dir=None, n_jobs=n_jobs)
+    with redirect_stdout(StringIO()):
+        start = time.perf_counter()
+        predictor.train(df.copy())
+        return time.perf_counter() - start
+
+
+def main():
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    print(f"{'items':>6} {'n_jobs=1 (s)':>13} {'n_jobs=-1 (s)':>14} {'speedup':>8}   ({os.cpu_count()} cores)")
+    for n_items in (8, 32):
+        df = synthetic_history(n_items=n_items)
+        serial = time_training(df, n_jobs=1)
+        parallel = time_training(df, n_jobs=-1)
+        print(f"{n_items:>6} {serial:>13.2f} {parallel:>14.2f} {serial / parallel:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
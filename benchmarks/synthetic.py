@@ -0,0 +1,77 @@
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+
+def synthetic_report(n_items=50, seed=0, extra_sections=True):
+    """Build the text of a TouchBistro style sales report CSV"""
+    rng = random.Random(seed)
+    lines = [
+        "Burgertone Sales Dashboard,,",
+        "SALES SUMMARY,,",
+        'Gross Sales,"$12,345.67",',
+        ",,",
+        "SALES BY MENU ITEM,,",
+        "Menu Item,Gross Sales,Quantity",
+    ]
+    for i in range(n_items):
+        quantity = rng.randint(0, 400)
+        price = rng.choice([8.5, 12.25, 14.0, 3.75])
+        lines.append(f'Item {i},"${quantity * price:,.2f}",{quantity}')
+    if extra_sections:
+        lines += [
+            ",,",
+            "SALES BY CATEGORY,,",
+            "Category,Gross Sales,Quantity",
+            'Burgers,"$1,000.00",80',
+            'Drinks,"$250.50",60',
+        ]
+    return "\n".join(lines) + "\n"
+
+
+def synthetic_report_files(directory, n_days=30, n_items=50, start=datetime(2024, 1, 1)):
+    """Write `n_days` daily reports into `directory`/reports/ and return their paths"""
+    import os
+    reports_dir = os.path.join(directory, "reports")
+    os.makedirs(reports_dir, exist_ok=True)
+    paths = []
+    for day in range(n_days):
+        date_str = (start + timedelta(days=day)).strftime('%Y-%m-%d')
+        path = os.path.join(reports_dir, f"{date_str}.csv")
+        with open(path, "w") as f:
+            f.write(synthetic_report(n_items=n_items, seed=day))
+        paths.append(path)
+    return paths
+
+
+def synthetic_history(n_items=40, n_days=365, seed=0):
+    """Daily sales history with a weekly pattern for `n_items` items"""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2023-01-01", periods=n_days, freq="D")
+    frames = []
+    for i in range(n_items):
+        quantity = 10 + i + 8 * (dates.dayofweek >= 5) + rng.integers(0, 6, size=n_days)
+        frames.append(pd.DataFrame({
+            'date': dates,
+            'item_name': f"Item {i}",
+            'quantity': quantity,
+            'sales': quantity * 9.5,
+        }))
+    return pd.concat(frames, ignore_index=True).sort_values(['date', 'item_name']).reset_index(drop=True)
+
+
+def synthetic_legacy_history(n_days=730, n_items=300, seed=0):
+    """Standardized history in the original layout: date-major, object strings, int64"""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2023-01-01", periods=n_days)
+    items = np.array([f"Menu Item {i}" for i in range(n_items)], dtype=object)
+    df = pd.DataFrame({
+        'date': np.repeat(dates, n_items),
+        'item_name': np.tile(items, n_days),
+        'quantity': rng.integers(0, 60, n_days * n_items),
+        'sales': np.round(rng.random(n_days * n_items) * 500, 2),
+    })
+    df['original_item_name'] = df['item_name']
+    return df